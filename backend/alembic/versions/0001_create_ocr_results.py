@@ -0,0 +1,39 @@
+"""create ocr_results
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ocr_results",
+        sa.Column("cache_key", sa.String(length=64), nullable=False),
+        sa.Column("model_version", sa.String(length=64), nullable=False),
+        sa.Column("predictions", sa.JSON(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("cache_key"),
+    )
+    op.create_index(
+        op.f("ix_ocr_results_model_version"), "ocr_results", ["model_version"]
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_ocr_results_model_version"), table_name="ocr_results")
+    op.drop_table("ocr_results")
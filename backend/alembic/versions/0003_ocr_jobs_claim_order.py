@@ -0,0 +1,34 @@
+"""index ocr_jobs in claim order
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+CLAIMABLE = sa.text("status IN ('queued', 'running')")
+
+
+def upgrade():
+    op.drop_index("ix_ocr_jobs_claim", table_name="ocr_jobs")
+    op.create_index(
+        "ix_ocr_jobs_claim",
+        "ocr_jobs",
+        [sa.text("priority DESC"), "available_at"],
+        postgresql_where=CLAIMABLE,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_ocr_jobs_claim", table_name="ocr_jobs")
+    op.create_index(
+        "ix_ocr_jobs_claim", "ocr_jobs", ["status", "priority", "available_at"]
+    )
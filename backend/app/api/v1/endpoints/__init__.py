@@ -2,8 +2,12 @@
 
 from fastapi import APIRouter
 from .default import router as default_router  # Import your new file
-from .ocr import router as ocr_router  # Import the OCR router
+from .jobs import router as jobs_router
 
+# the OCR and object detection APIs are Ray Serve applications of their own
+# (see ocr.py / object_detection.py); they are not imported here so the API
+# process starts without torch, ultralytics or Ray. Jobs queued through
+# /jobs are run by workers in the OCR ingress
 router = APIRouter()
 router.include_router(default_router, prefix="/default", tags=["Default"])
-router.include_router(ocr_router, prefix="/ocr", tags=["OCR"])
+router.include_router(jobs_router, prefix="/jobs", tags=["Jobs"])
@@ -1,7 +1,64 @@
+import asyncio
+import os
+
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 
 router = APIRouter()
 
+# Ray cluster the Serve applications run on, and how long the readiness
+# probe waits for it
+RAY_ADDRESS = os.getenv("RAY_ADDRESS", "auto")
+READINESS_TIMEOUT_S = 5
+
+
 @router.get("/health")
+@router.get("/health/live")
 async def health_check():
+    """Liveness: the API process is up. Touches neither the models nor Ray."""
     return {"status": "ok"}
+
+
+def serve_status():
+    """Status of every Serve application and its deployments."""
+    # imported lazily so liveness and API start-up do not load Ray
+    import ray
+    from ray import serve
+
+    if not ray.is_initialized():
+        ray.init(address=RAY_ADDRESS, namespace="serve", log_to_driver=False)
+    return {
+        name: {
+            "status": application.status,
+            "deployments": {
+                deployment: status.status
+                for deployment, status in application.deployments.items()
+            },
+        }
+        for name, application in serve.status().applications.items()
+    }
+
+
+@router.get("/health/ready")
+async def readiness_check():
+    """Readiness: every Serve application is running.
+
+    Replicas only report healthy once their models are loaded and warmed up,
+    so this stays 503 while weights load or kernels compile.
+    """
+    try:
+        applications = await asyncio.wait_for(
+            asyncio.to_thread(serve_status), READINESS_TIMEOUT_S
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=503, content={"status": "unavailable", "detail": f"{e}"}
+        )
+
+    ready = bool(applications) and all(
+        application["status"] == "RUNNING" for application in applications.values()
+    )
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "loading", "applications": applications},
+    )
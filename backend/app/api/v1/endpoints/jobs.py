@@ -0,0 +1,64 @@
+import os
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+
+from app.core.jobs import JOB_MAX_ATTEMPTS, JobQueueFull, submit_job
+from app.db.models import OCRJob
+from app.db.session import get_db
+
+router = APIRouter()
+
+# backpressure: submissions are refused with 429 past this many pending jobs
+JOBS_MAX_QUEUED = int(os.getenv("OCR_JOBS_MAX_QUEUED", "1000"))
+
+
+@router.post("", status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    priority: int = Query(0, ge=-100, le=100),
+    max_attempts: int = Query(JOB_MAX_ATTEMPTS, ge=1, le=10),
+    db=Depends(get_db),
+):
+    """Queue an image for OCR; poll ``GET /jobs/{id}`` for the result.
+
+    Higher ``priority`` jobs are picked up first.
+    """
+    image_data = await file.read()
+    if not image_data:
+        raise HTTPException(status_code=400, detail="Empty upload")
+
+    try:
+        job_id = await submit_job(
+            db,
+            image_data,
+            filename=file.filename,
+            priority=priority,
+            max_attempts=max_attempts,
+            max_queued=JOBS_MAX_QUEUED,
+        )
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"{e}",
+            headers={"Retry-After": str(int(e.retry_after_s))},
+        )
+    return {"id": job_id, "status": "queued"}
+
+
+@router.get("/{job_id}")
+async def read_job(job_id: str, db=Depends(get_db)):
+    job = await db.get(OCRJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "id": job.id,
+        "status": job.status,
+        "priority": job.priority,
+        "filename": job.filename,
+        "attempts": job.attempts,
+        "predictions": job.predictions,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -1,51 +1,66 @@
-import os 
-import tempfile
-from io import BytesIO
+import asyncio
+import logging
+import os
 
 import numpy as np
-import requests
 from fastapi import FastAPI, File, HTTPException, UploadFile
 from fastapi.responses import Response
-from PIL import Image
+from app.core.annotation import LabelRenderer, annotate, class_color
+from app.core.cpu import apply_cpu_profile
+from app.core.http import FetchError, ImageFetcher
+from app.core.images import decode_image, encode_image, to_bgr
+from app.models.detections import result_lists
+from app.models.registry import load_model, resolve
 from ray import serve
-from ultralytics import YOLO
-from ultralytics.utils.plotting import Annotator, colors
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+OBJECT_DETECTION = "object_detection"
+OBJECT_DETECTION_VERSION = os.getenv("OCR_OBJECT_DETECTION_VERSION", "latest")
+# size of the blank image each replica runs once before taking traffic
+WARMUP_IMAGE_SIZE = (640, 640)
+
 @serve.deployment(num_replicas=1)
 @serve.ingress(app)
 
 class APIIngress:
     def __init__(self, object_detection_handler):
         self.object_detection_handler = object_detection_handler
+        self.fetcher = ImageFetcher()
+        self.label_renderer = LabelRenderer()
 
     async def process_image(self, image_data: bytes) -> Response:
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-                temp_file.write(image_data)
-                temp_file_path = temp_file.name
-            
-            bboxes, classes, names, confs = await self.handle.detect.remote(temp_file_path)
-            image = Image.open(temp_file_path)
-            image_array = np.array(image)
-
-            annotator = Annotator(image_array, font="Arial.ttf", pil=True)
-
-            for bbox, cls, conf in zip(bboxes, classes, confs):
-                x1, y1, x2, y2 = bbox
-                color = colors(cls, True)
-                annotator.box_label([x1, y1, x2, y2], names[cls], color=color)
-
-            # Covnert the image back to bytes
-            annotated_image = Image.fromarray(annotator.result())
-            file_stream = BytesIO()
-            annotated_image.save(file_stream, format="PNG")
-            file_stream.seek(0)
-
-            # Clean up the temporary file
-            os.unlink(temp_file_path)
-            return Response(content=file_stream.getvalue(), media_type="image/png")
+            image_array = decode_image(image_data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{e}")
+
+        try:
+            (
+                bboxes,
+                classes,
+                names,
+                confs,
+                model_version,
+            ) = await self.object_detection_handler.detect.remote(image_array)
+
+            annotated_image = await asyncio.to_thread(
+                annotate,
+                image_array,
+                bboxes,
+                [names[cls] for cls in classes],
+                [class_color(cls) for cls in classes],
+                renderer=self.label_renderer,
+            )
+            content = encode_image(annotated_image, "png")
+
+            return Response(
+                content=content,
+                media_type="image/png",
+                headers={"X-Model-Version": model_version},
+            )
         
         except Exception as e:
             raise HTTPException(status_code=500, detail= f"Error processing image: {str(e)}")
@@ -54,13 +69,14 @@ class APIIngress:
     @app.get("/detect", response_class=Response)
     async def detect_url(self, url:str):
         try:
-            response = requests.get(url)
-            if response.status_code != 200:
-                raise HTTPException(status_code=400, detail="Invalid image URL")
-            
-            image_data = response.content
+            image_data = await self.fetcher.fetch(url)
             return await self.process_image(image_data)
+
+        except FetchError as e:
+            raise HTTPException(status_code=e.status_code, detail=f"Error fetching image from URL: {e}")
         
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error fetching image from URL: {str(e)}")
         
@@ -70,6 +86,8 @@ class APIIngress:
             image_data = await file.read()
             return await self.process_image(image_data)
         
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error processing uploaded image: {str(e)}")
         
@@ -85,23 +103,49 @@ class APIIngress:
 )
 
 class ObjectDetectionHandler:
-    def __init__(self):
-        self.model = YOLO("yolov8n.pt")
-    
-    def detect(self, image_path: str):
-        results = self.model(image_path, conf=0.25)
-        bboxes = []
-        classes = []
-        names = results[0].names
-        confs = []
-        try:
-            for result in results:
-                for box in result.boxes:
-                    bboxes.append(box.xyxy[0].cpu().numpy())
-                    classes.append(int(box.cls[0].cpu().numpy()))
-                    confs.append(float(box.conf[0].cpu().numpy()))
+    def __init__(self, version=OBJECT_DETECTION_VERSION):
+        self.cpu_profile = apply_cpu_profile()
+        model_version = resolve(OBJECT_DETECTION, version)
+        self.model = load_model(model_version)
+        self.model_version = model_version.version
+        self.swap_lock = asyncio.Lock()
+        # the replica only reports healthy once __init__ returns, so traffic
+        # never hits a cold predictor
+        self.warmup()
+
+    def warmup(self, model=None):
+        """Set up the YOLO predictor and run one inference on a blank image."""
+        model = self.model if model is None else model
+        model(np.zeros((*WARMUP_IMAGE_SIZE, 3), dtype=np.uint8), conf=0.25, verbose=False)
+
+    async def reconfigure(self, config):
+        """Switch weights when the Serve ``user_config`` sets ``model_version``."""
+        if "model_version" in config:
+            await self.load_version(config["model_version"])
 
-            return bboxes, classes, names, confs
+    async def load_version(self, version):
+        async with self.swap_lock:
+            model_version = await asyncio.to_thread(resolve, OBJECT_DETECTION, version)
+            if model_version.version == self.model_version:
+                return
+            model = await asyncio.to_thread(self.prepare_model, model_version)
+            self.model, self.model_version = model, model_version.version
+            logger.info(f"Object detector switched to {model_version.version}")
+
+    def prepare_model(self, model_version):
+        model = load_model(model_version)
+        # warmed up before the swap, so requests never hit a cold predictor
+        self.warmup(model)
+        return model
+
+    def detect(self, image: np.ndarray):
+        """``(boxes, class ids, class names, confidences, model version)`` of one image."""
+        model, model_version = self.model, self.model_version
+        # one image in, one result out
+        result = model(to_bgr(image), conf=0.25, verbose=False)[0]
+        try:
+            bboxes, classes, confs = result_lists(result)
+            return bboxes, classes, result.names, confs, model_version
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error processing detection results: {str(e)}")
 
@@ -1,215 +1,1429 @@
+import asyncio
+import hashlib
+import json
 import os
-import tempfile
-from io import BytesIO
+import time
+from typing import List, Optional
 
 import numpy as np
-import requests
+import ray
 import torch
-from app.models.crnn import CRNN
-from fastapi import FastAPI, File, HTTPException, UploadFile, APIRouter
-from fastapi.responses import Response
-from PIL import Image
+from app.api.v1.endpoints.object_detection import (
+    OBJECT_DETECTION_VERSION,
+    ObjectDetectionHandler,
+)
+from app.core.admission import (
+    AdmissionController,
+    AdmittedStreamingResponse,
+    MaxBodySizeMiddleware,
+    Overloaded,
+    client_id,
+    parse_networks,
+)
+from app.core.annotation import LabelRenderer, draw_predictions
+from app.core.cache import CropCache, LRUCache, OCRResultCache
+from app.core.cpu import (
+    apply_cpu_profile,
+    assigned_cpus,
+    cpu_executor,
+    model_executor,
+    pool_workers,
+    run_in,
+)
+from app.core.documents import DEFAULT_DPI, aiter_document_pages, is_multipage
+from app.core.http import FetchError, ImageFetcher
+from app.core.metrics import StageMetrics, scrape_metrics, server_timing
+from app.core.serving import BatchMetrics, deployment_options, report_startup
+from app.core.images import (
+    IMAGE_MEDIA_TYPES,
+    crop_image,
+    decode_image,
+    encode_image,
+    iter_upload_images,
+    to_bgr,
+)
+from app.models.backends import load_recognition_backend
+from app.models.crnn import CHARS, INPUT_SIZE, char_maps
+from app.models.detections import detection_dicts, detection_lists
+from app.models.ctc import BLANK_CHAR, beam_search_decode, greedy_decode
+from app.models.shared_weights import materialize, release_module, share_module
+from app.models.tiling import (
+    TILE_NMS_IOU,
+    TILE_OVERLAP,
+    TILE_SIZE,
+    TILING_THRESHOLD,
+    check_tiling,
+    merge_tile_detections,
+    tile_image,
+    touches_tile_edge,
+)
+from app.models.registry import LEGACY_MODELS, legacy_version, load_model, resolve
+from app.models.preprocessing import (
+    HASH_BITS,
+    WIDTH_BUCKETS,
+    bucket_by_width,
+    crop_digests,
+    crop_hashes,
+    prepare_crop,
+    quantize_crops,
+)
+from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, Response
 from ray import serve
-from torchvision import transforms
-from ultralytics import YOLO
-from ultralytics.utils.plotting import Annotator, colors
+from ray.serve import metrics
+from ray.serve.exceptions import BackPressureError
 import logging
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
 app = FastAPI()
 
-TEXT_DETECTION_MODEL = 'backend/app/models/weights/best.pt'
-OCR_MODEL = 'backend/app/models/weights/ocr_crnn.pt'
+# models in the registry (see app.models.registry) and the versions to serve;
+# running replicas switch versions through their Serve user_config
+# {"model_version": ...} without a restart
+TEXT_DETECTION = "text_detection"
+TEXT_RECOGNITION = "text_recognition"
+TEXT_DETECTION_VERSION = os.getenv("OCR_TEXT_DETECTION_VERSION", "latest")
+TEXT_RECOGNITION_VERSION = os.getenv("OCR_TEXT_RECOGNITION_VERSION", "latest")
+
+# "eager", "quantized" (INT8 dynamic quantization of the eager model, done at
+# load time), or the exported "torchscript" / "onnx" file of the version
+RECOGNITION_BACKEND = os.getenv("OCR_RECOGNITION_BACKEND", "eager")
 
-CHARS = '0123456789abcdefghijklmnopqrstuvwxyz-'
-CHAR_TO_IDX = {char: idx + 1 for idx, char in enumerate(sorted(CHARS))}
-IDX_TO_CHAR = {idx: char for char, idx in CHAR_TO_IDX.items()}
+# number of crops sent through the CRNN in a single forward pass
+RECOGNITION_BATCH_SIZE = 32
+
+# crops are stretched to the training width; with KEEP_ASPECT_RATIO they keep
+# their aspect ratio and are batched per width bucket, which is off until
+# benchmarks.quantization_accuracy shows it does not cost accuracy
+RECOGNITION_WIDTH_BUCKETS = WIDTH_BUCKETS
+RECOGNITION_KEEP_ASPECT_RATIO = (
+    os.getenv("OCR_RECOGNITION_KEEP_ASPECT_RATIO", "false").lower() == "true"
+)
+
+# recognition results of recurring crops (form labels, column headers) are
+# reused without running the CRNN; crops match when their quantized pixels
+# are identical. A TOLERANCE > 0 opts in to near matches: perceptual hashes
+# within TOLERANCE bits of HASH_BITS, confirmed pixel by pixel against the
+# stored crop. A size of 0 disables the cache.
+CROP_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CROP_CACHE_SIZE", 16384))
+CROP_CACHE_TOLERANCE = int(os.getenv("OCR_CROP_CACHE_TOLERANCE", 0))
+
+# CTC decoding: "greedy" or "beam"
+CTC_DECODER = os.getenv("OCR_CTC_DECODER", "greedy")
+CTC_BEAM_WIDTH = 8
+
+# images whose longer side exceeds the threshold are detected as overlapping
+# full-resolution tiles (see app.models.tiling), TILE_BATCH_SIZE tiles per
+# YOLO call
+DETECTION_TILE_SIZE = int(os.getenv("OCR_DETECTION_TILE_SIZE", TILE_SIZE))
+DETECTION_TILE_OVERLAP = int(os.getenv("OCR_DETECTION_TILE_OVERLAP", TILE_OVERLAP))
+DETECTION_TILING_THRESHOLD = int(
+    os.getenv("OCR_DETECTION_TILING_THRESHOLD", TILING_THRESHOLD)
+)
+DETECTION_TILE_BATCH_SIZE = 16
 
-# model configuration
-HIDDEN_SIZE = 256
-N_LAYERS = 3
-DROPOUT_PROB = 0.2
-UNFREEZE_LAYERS = 3
+# size of the blank image each detector replica runs once before taking traffic
+WARMUP_IMAGE_SIZE = (640, 640)
+
+# dynamic batching of concurrent requests inside each detector/recognizer replica
+MAX_BATCH_SIZE = 8
+BATCH_WAIT_TIMEOUT_MS = 10
+
+# resources and autoscaling per stage, overridable through OCR_DETECTOR_* and
+# OCR_RECOGNIZER_* environment variables (see app.core.serving); both stages
+# are CPU-only unless a GPU count is configured
+DETECTOR_OPTIONS = dict(num_cpus=1, num_gpus=0, max_replicas=2)
+RECOGNIZER_OPTIONS = dict(num_cpus=4, num_gpus=0, max_replicas=4)
+OBJECT_DETECTOR_OPTIONS = dict(num_cpus=1, num_gpus=0, max_replicas=2)
+
+# deploy the object detector next to the OCR stages for /analyze, at
+# OCR_OBJECT_DETECTION_VERSION; off by default, since without a registered
+# version the unregistered yolov8n.pt weights are downloaded at start-up
+ANALYZE_OBJECTS = os.getenv("OCR_ANALYZE_OBJECTS", "false").lower() == "true"
+
+# "json" skips annotation entirely; image formats return the annotated image
+RESPONSE_FORMATS = ("json",) + tuple(IMAGE_MEDIA_TYPES)
+DEFAULT_IMAGE_QUALITY = 85
+
+# image responses repeat the predictions in X-Predictions only up to this many
+# bytes; proxies reject larger headers, so bigger results need format=json
+MAX_PREDICTIONS_HEADER = 8 * 1024
+
+# pages of a bulk request or document that may be in flight at the same time;
+# the next page is only read or rasterized once one finishes
+BULK_MAX_CONCURRENCY = 16
+
+# resolution multi-page PDFs and TIFFs are rasterized at
+DOCUMENT_DPI = int(os.getenv("OCR_DOCUMENT_DPI", DEFAULT_DPI))
+
+# OCR result cache, keyed by the image bytes and the model weights
+RESULT_CACHE_MAX_ENTRIES = 1024
+RESULT_CACHE_TTL_S = 24 * 60 * 60
+RESULT_CACHE_PERSIST = os.getenv("OCR_RESULT_CACHE_DB", "false").lower() == "true"
+# /analyze object detections, keyed the same way; in memory only
+OBJECT_CACHE_MAX_ENTRIES = 1024
+
+# admission control per ingress replica (see app.core.admission): requests
+# beyond MAX_IN_FLIGHT wait for a slot, and are refused with 429/503 and
+# Retry-After when a client has too many in flight, the queue is full, or
+# the expected wait exceeds the latency SLO
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("OCR_MAX_IN_FLIGHT", 64))
+ADMISSION_MAX_QUEUED = int(os.getenv("OCR_MAX_QUEUED", 256))
+ADMISSION_MAX_PER_CLIENT = int(os.getenv("OCR_MAX_PER_CLIENT", 32))
+# X-Forwarded-For only identifies the client behind these proxies
+TRUSTED_PROXIES = parse_networks(os.getenv("OCR_TRUSTED_PROXIES", ""))
+LATENCY_SLO_MS = float(os.getenv("OCR_LATENCY_SLO_MS", 5000))
+# request bodies are refused with 413 past this size while they stream in
+MAX_UPLOAD_BYTES = int(os.getenv("OCR_MAX_UPLOAD_MB", 50)) * 1024 * 1024
+# detector/recognizer calls waiting at the ingress beyond this fail fast
+STAGE_MAX_QUEUED_REQUESTS = 8 * MAX_BATCH_SIZE
+
+app.add_middleware(MaxBodySizeMiddleware, max_bytes=MAX_UPLOAD_BYTES)
+
+# run queued /jobs (see app.core.jobs) in each ingress replica
+JOBS_WORKER = os.getenv("OCR_JOBS_WORKER", "false").lower() == "true"
 
 @serve.deployment(num_replicas=1)
 @serve.ingress(app)
 
 class APIIngress:
-    def __init__(self, ocr_handler):
-        self.ocr_handler = ocr_handler
-    
-    async def process_image(self, image_data: bytes) -> Response:
+    def __init__(
+        self,
+        text_detector,
+        text_recognizer,
+        detector_version="",
+        recognizer_version="",
+        object_detector=None,
+        persist_results=RESULT_CACHE_PERSIST,
+        run_jobs=JOBS_WORKER,
+    ):
+        self.text_detector = text_detector
+        self.text_recognizer = text_recognizer
+        self.object_detector = object_detector
+        self.fetcher = ImageFetcher()
+        # image decode, annotation and encode, off the event loop
+        self.cpu_pool = cpu_executor(name="ocr-ingress-cpu")
+        self.admission = AdmissionController(
+            max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+            max_queued=ADMISSION_MAX_QUEUED,
+            max_per_client=ADMISSION_MAX_PER_CLIENT,
+            slo_ms=LATENCY_SLO_MS,
+        )
+        self.trusted_proxies = TRUSTED_PROXIES
+
+        # last model versions the stages reported
+        self.model_versions = {"detector": detector_version, "recognizer": recognizer_version}
+
+        session_factory = None
+        if persist_results:
+            from app.db.session import AsyncSessionLocal
+
+            session_factory = AsyncSessionLocal
+        self.result_cache = OCRResultCache(
+            self.pipeline_version(),
+            max_entries=RESULT_CACHE_MAX_ENTRIES,
+            ttl_s=RESULT_CACHE_TTL_S,
+            session_factory=session_factory,
+        )
+        # last object detector version reported; "" until the first call
+        self.object_version = ""
+        self.object_cache = LRUCache(
+            max_entries=OBJECT_CACHE_MAX_ENTRIES, ttl_s=RESULT_CACHE_TTL_S
+        )
+        self.cache_hits = metrics.Counter(
+            "ocr_result_cache_hits",
+            description="OCR requests answered from the result cache.",
+            tag_keys=("tier",),
+        )
+        self.cache_misses = metrics.Counter(
+            "ocr_result_cache_misses",
+            description="OCR requests that had to run detection and recognition.",
+        )
+        self.stage_metrics = StageMetrics()
+        # glyphs and labels cached across requests
+        self.label_renderer = LabelRenderer()
+        self.boxes_per_image = metrics.Histogram(
+            "ocr_boxes_per_image",
+            description="Text boxes found by the detector in one image.",
+            boundaries=[1, 2, 5, 10, 20, 50, 100, 200, 500],
+        )
+
+        self.job_worker = None
+        if run_jobs:
+            from app.core.jobs import JobWorker
+            from app.db.session import AsyncSessionLocal
+
+            self.job_worker = JobWorker(AsyncSessionLocal, self.ocr_job)
+            # Serve runs the constructor on the replica's event loop
+            self.job_worker_task = asyncio.get_running_loop().create_task(
+                self.job_worker.run()
+            )
+
+    def observe_versions(self, detector_version=None, recognizer_version=None):
+        """Record the model versions a stage reported; return the pipeline version.
+
+        The result cache keys new entries with it, so once replicas report new
+        weights the results of the old ones stop being served.
+        """
+        if detector_version:
+            self.model_versions["detector"] = detector_version
+        if recognizer_version:
+            self.model_versions["recognizer"] = recognizer_version
+        self.result_cache.model_version = self.pipeline_version()
+        return self.result_cache.model_version
+
+    def pipeline_version(self):
+        return f"{self.model_versions['detector']}+{self.model_versions['recognizer']}"
+
+    async def run_ocr(
+        self, image_data: bytes, image=None, timings=None, content_id=None, load_image=None
+    ):
+        """Return ``(predictions, model_version)`` for an upload, checking the result cache first.
+
+        ``image`` may be passed when the caller already decoded the upload,
+        or ``load_image``, an async callable returning the decoded image or
+        its object store ref, when the decode is shared with another stage;
+        ``timings`` is filled with per-stage milliseconds when given. Pages
+        rasterized from a document have no bytes of their own and pass a
+        ``content_id`` to cache them by instead.
+        """
+        timings = {} if timings is None else timings
+        content = content_id or image_data
+        model_version = self.result_cache.model_version
+        prediction, tier = await self.result_cache.get(
+            self.result_cache.key(content, model_version)
+        )
+        if prediction is not None:
+            self.cache_hits.inc(tags={"tier": tier})
+            timings["cache"] = tier
+            return prediction, model_version
+
+        self.cache_misses.inc()
+        timings["cache"] = "miss"
+        if image is None and load_image is not None:
+            image = await load_image()
+        elif image is None:
+            with self.stage_metrics.time(timings, "decode"):
+                image = await run_in(self.cpu_pool, decode_image, image_data)
+
+        started_at = time.perf_counter()
+        prediction, model_version = await self.predict(image, timings)
+        timings["ocr"] = round((time.perf_counter() - started_at) * 1000, 2)
+
+        # keyed by the versions that actually ran, which may be newer
+        await self.result_cache.set(
+            self.result_cache.key(content, model_version), prediction, model_version
+        )
+        return prediction, model_version
+
+    async def ocr_job(self, image_data: bytes):
+        """Predictions of a queued job.
+
+        A PDF or multi-page TIFF gives one ``{"page", "name", "predictions"}``
+        entry per page, in page order. A failing page fails the attempt, so
+        the job is retried as a whole.
+        """
+        if not is_multipage(image_data):
+            prediction, _ = await self.run_ocr(image_data)
+            return prediction
+
+        semaphore = asyncio.Semaphore(BULK_MAX_CONCURRENCY)
+
+        async def run_page(index, page):
+            try:
+                prediction, _ = await self.run_ocr(
+                    None, page["image"], page["timings"], content_id=page["content_id"]
+                )
+            finally:
+                semaphore.release()
+            return {"page": index, "name": page["name"], "predictions": prediction}
+
+        pages = self.document_pages("document", image_data, DOCUMENT_DPI)
+        tasks = []
         try:
-            ###
-            with tempfile.NamedTemporaryFile(delete=False) as temp_image:
-                temp_image.write(image_data)
-                temp_image_path = temp_image.name
+            async for page in pages:
+                if "error" in page:
+                    raise ValueError(page["error"])
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(run_page(len(tasks), page)))
+            return await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await pages.aclose()
 
-            prediction = await self.ocr_handler.process_image.remote(temp_image_path)
+    async def predict(self, image, timings=None):
+        """Compose the detector and recognizer deployments for one image.
 
-            image = Image.open(temp_image_path)
-            annotated_image = await self.ocr_handler.draw_predictions.remote(
-                image, prediction
+        Returns ``(predictions, model_version)``; ``timings`` is filled with
+        the stage timings the replicas report.
+        """
+        timings = {} if timings is None else timings
+        # one copy in the object store, read zero-copy by both stages
+        image_ref = image if isinstance(image, ray.ObjectRef) else ray.put(image)
+        try:
+            boxes, detect_timings, detector_version = await self.text_detector.detect.remote(
+                image_ref
             )
-        
-            file_stream = BytesIO()
-            annotated_image.save(file_stream, format="PNG")
-            file_stream.seek(0)
+        except BackPressureError as e:
+            self.admission.metrics.shed.inc(tags={"reason": "detect_queue_full"})
+            raise Overloaded(f"Text detector busy: {e}")
+        except Exception:
+            self.stage_metrics.errors.inc(tags={"stage": "detect"})
+            raise
+        timings.update(detect_timings)
+        self.boxes_per_image.observe(len(boxes))
+        if not boxes:
+            return [], self.observe_versions(detector_version)
 
+        try:
+            texts, recognize_timings, recognizer_version = (
+                await self.text_recognizer.recognize.remote(
+                    image_ref, [bbox for bbox, _, _ in boxes]
+                )
+            )
+        except BackPressureError as e:
+            self.admission.metrics.shed.inc(tags={"reason": "recognize_queue_full"})
+            raise Overloaded(f"Text recognizer busy: {e}")
+        except Exception:
+            self.stage_metrics.errors.inc(tags={"stage": "recognize"})
+            raise
+        timings.update(recognize_timings)
+        model_version = self.observe_versions(detector_version, recognizer_version)
+        return [
+            {
+                "bbox": bbox,
+                "class": name,
+                "confidence": conf,
+                "text": text,
+                "text_confidence": text_conf,
+            }
+            for (bbox, name, conf), (text, text_conf) in zip(boxes, texts)
+        ], model_version
+
+    async def detect_objects(self, image_data: bytes, load_image, timings):
+        """Return ``(objects, model_version)``, checking the object cache first.
+
+        ``load_image`` is only called on a miss, so a cached answer never
+        needs the pixels.
+        """
+        key = self.result_cache.key(image_data, f"objects:{self.object_version}")
+        objects = self.object_cache.get(key)
+        if objects is not None:
+            timings["objects_cache"] = "memory"
+            return objects, self.object_version
 
-            os.unlink(temp_image_path)
+        timings["objects_cache"] = "miss"
+        image_ref = await load_image()
+        try:
+            with self.stage_metrics.time(timings, "objects"):
+                boxes, classes, names, confs, model_version = (
+                    await self.object_detector.detect.remote(image_ref)
+                )
+        except BackPressureError as e:
+            self.admission.metrics.shed.inc(tags={"reason": "objects_queue_full"})
+            raise Overloaded(f"Object detector busy: {e}")
+        objects = detection_dicts(boxes, classes, confs, names)
+        self.object_version = model_version
+        self.object_cache.set(
+            self.result_cache.key(image_data, f"objects:{model_version}"), objects
+        )
+        return objects, model_version
+
+    async def analyze_image(self, image_data: bytes, text=True, objects=True, timings=None):
+        """Text and object regions of one image, decoded and stored once for both.
+
+        Both answers are cached per image: the text predictions in the OCR
+        result cache ``/ocr`` shares, the object detections next to it.
+        Returns ``{"text", "objects", "model_version"}`` with the parts asked for.
+        """
+        if objects and self.object_detector is None:
+            raise HTTPException(status_code=501, detail="Object detection is not deployed")
+        timings = {} if timings is None else timings
+
+        decoding = None
+
+        async def load_image():
+            # whichever stage misses its cache first decodes, for both
+            nonlocal decoding
+            if decoding is None:
+                decoding = asyncio.ensure_future(self.decode_to_store(image_data, timings))
+            return await decoding
+
+        calls = []
+        if text:
+            calls.append(self.run_ocr(image_data, timings=timings, load_image=load_image))
+        if objects:
+            calls.append(self.detect_objects(image_data, load_image, timings))
+        answers = await asyncio.gather(*calls)
+
+        result = {"model_version": {}}
+        if text:
+            result["text"], result["model_version"]["text"] = answers.pop(0)
+        if objects:
+            result["objects"], result["model_version"]["objects"] = answers.pop(0)
+        return result
+
+    async def decode_to_store(self, image_data: bytes, timings):
+        """Decode an upload and put it in the object store, for several stages to read."""
+        with self.stage_metrics.time(timings, "decode"):
+            image = await run_in(self.cpu_pool, decode_image, image_data)
+        return ray.put(image)
+
+    async def process_analysis(self, image_data: bytes, text, objects, timings):
+        if objects is None:
+            # objects are included by default when the detector is deployed
+            objects = self.object_detector is not None
+        try:
+            result = await self.analyze_image(image_data, text, objects, timings)
+        except HTTPException:
+            raise
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{e}")
+        except Overloaded as e:
+            raise HTTPException(status_code=e.status_code, detail=f"{e}", headers=e.headers)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"{e}")
+        return JSONResponse(
+            content=result,
+            headers={
+                "X-Model-Version": ", ".join(
+                    f"{part}={version}" for part, version in result["model_version"].items()
+                ),
+                "Server-Timing": server_timing(timings),
+            },
+        )
 
+    def draw_predictions(self, image, predictions, scale=1.0):
+        return draw_predictions(image, predictions, scale=scale, renderer=self.label_renderer)
+
+    async def process_image(
+        self,
+        image_data: bytes,
+        response_format: str = "json",
+        quality: int = DEFAULT_IMAGE_QUALITY,
+        timings=None,
+        preview_scale: float = 1.0,
+    ) -> Response:
+        """OCR one image and answer in ``response_format``.
+
+        The stage breakdown is sent back in a ``Server-Timing`` header. Annotated
+        images are drawn at ``preview_scale`` times the input resolution.
+        """
+        timings = {} if timings is None else timings
+        if response_format not in RESPONSE_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"format must be one of {', '.join(RESPONSE_FORMATS)}",
+            )
+
+        image = None
+        try:
+            # a cached JSON answer never needs the pixels
+            if response_format != "json":
+                with self.stage_metrics.time(timings, "decode"):
+                    image = await run_in(self.cpu_pool, decode_image, image_data)
+            prediction, model_version = await self.run_ocr(image_data, image, timings)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{e}")
+        except Overloaded as e:
+            raise HTTPException(status_code=e.status_code, detail=f"{e}", headers=e.headers)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"{e}")
+
+        try:
+            if response_format == "json":
+                return JSONResponse(
+                    content={"predictions": prediction, "model_version": model_version},
+                    headers={
+                        "X-Model-Version": model_version,
+                        "Server-Timing": server_timing(timings),
+                    },
+                )
+
+            with self.stage_metrics.time(timings, "annotate"):
+                annotated_image = await run_in(
+                    self.cpu_pool, self.draw_predictions, image, prediction, preview_scale
+                )
+            with self.stage_metrics.time(timings, "encode"):
+                content = await run_in(
+                    self.cpu_pool, encode_image, annotated_image, response_format, quality
+                )
+            headers = {"X-Model-Version": model_version, "Server-Timing": server_timing(timings)}
+            predictions_header = json.dumps(prediction)
+            if len(predictions_header) <= MAX_PREDICTIONS_HEADER:
+                headers["X-Predictions"] = predictions_header
             return Response(
-                content=file_stream.getvalue(),
-                media_type="image/png",
-                headers={"X-Predictions": str(prediction)},
+                content=content,
+                media_type=IMAGE_MEDIA_TYPES[response_format],
+                headers=headers,
             )
         
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"{e}")
         
 
+    async def admit(self, request):
+        """Take an admission slot for ``request``, or refuse it right away with 429/503."""
+        try:
+            return await self.admission.acquire(client_id(request, self.trusted_proxies))
+        except Overloaded as e:
+            raise HTTPException(status_code=e.status_code, detail=f"{e}", headers=e.headers)
+
     @app.get("/ocr")
-    async def ocr_url(self, image_url: str):
+    async def ocr_url(
+        self,
+        request: Request,
+        image_url: str,
+        response_format: str = Query("json", alias="format"),
+        quality: int = Query(DEFAULT_IMAGE_QUALITY, ge=1, le=100),
+        preview_scale: float = Query(1.0, gt=0, le=1),
+    ):
+        ticket = await self.admit(request)
         try:
-            response = requests.get(image_url)
-            response.raise_for_status()
-            return await self.process_image(response.content)
-        except requests.RequestException as e:
-            raise HTTPException(status_code=500, detail=f"{e}")
+            timings = {}
+            try:
+                # pooled, non-blocking download so one slow URL stalls no one else
+                with self.stage_metrics.time(timings, "upload"):
+                    image_data = await self.fetcher.fetch(image_url)
+            except FetchError as e:
+                raise HTTPException(status_code=e.status_code, detail=f"{e}")
+            return await self.process_image(
+                image_data, response_format, quality, timings, preview_scale
+            )
+        finally:
+            self.admission.release(ticket)
     
     @app.post("/ocr/upload")
-    async def ocr_upload(self, file: UploadFile = File(...)):
-        ###
-        return await self.process_image(await file.read())
+    async def ocr_upload(
+        self,
+        request: Request,
+        file: UploadFile = File(...),
+        response_format: str = Query("json", alias="format"),
+        quality: int = Query(DEFAULT_IMAGE_QUALITY, ge=1, le=100),
+        preview_scale: float = Query(1.0, gt=0, le=1),
+        dpi: int = Query(DOCUMENT_DPI, ge=36, le=600),
+    ):
+        """OCR one image, or every page of a multi-page PDF or TIFF.
 
+        Documents are answered like ``/ocr/batch``, one NDJSON line per page,
+        whatever ``format`` asks for.
+        """
+        ticket = await self.admit(request)
+        try:
+            timings = {}
+            with self.stage_metrics.time(timings, "upload"):
+                image_data = await file.read()
+            if is_multipage(image_data):
+                pages = self.stream_pages(self.document_pages(file.filename, image_data, dpi))
+                response = AdmittedStreamingResponse(
+                    pages, self.admission, ticket, media_type="application/x-ndjson"
+                )
+                # the response releases the slot once it has been sent
+                ticket = None
+                return response
+            return await self.process_image(
+                image_data, response_format, quality, timings, preview_scale
+            )
+        finally:
+            if ticket is not None:
+                self.admission.release(ticket)
 
+    @app.get("/analyze")
+    async def analyze_url(
+        self,
+        request: Request,
+        image_url: str,
+        text: bool = Query(True),
+        objects: Optional[bool] = Query(None),
+    ):
+        """Text and object regions of one image, from a single download and decode."""
+        ticket = await self.admit(request)
+        try:
+            timings = {}
+            try:
+                with self.stage_metrics.time(timings, "upload"):
+                    image_data = await self.fetcher.fetch(image_url)
+            except FetchError as e:
+                raise HTTPException(status_code=e.status_code, detail=f"{e}")
+            return await self.process_analysis(image_data, text, objects, timings)
+        finally:
+            self.admission.release(ticket)
 
-@serve.deployment(
-    ray_actor_options={"num_gpus": 1, "num_cpus": 1},
-    autoscaling_config={"min_replicas": 1, "max_replicas": 2},
-)
+    @app.post("/analyze/upload")
+    async def analyze_upload(
+        self,
+        request: Request,
+        file: UploadFile = File(...),
+        text: bool = Query(True),
+        objects: Optional[bool] = Query(None),
+    ):
+        """Text and object regions of one uploaded image."""
+        ticket = await self.admit(request)
+        try:
+            timings = {}
+            with self.stage_metrics.time(timings, "upload"):
+                image_data = await file.read()
+            return await self.process_analysis(image_data, text, objects, timings)
+        finally:
+            self.admission.release(ticket)
 
-class OCRHandler:
-    def __init__(self, reg_model, det_model):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.det_model = det_model.to(self.device)
-        self.reg_model = reg_model.to(self.device)
-
-        self.transform = transforms.Compose(
-            [
-                transforms.Resize((100, 420)),
-                transforms.Grayscale(num_output_channels=1),
-                transforms.ToTensor(),
-                transforms.Normalize((0.5,), (0.5,)),
-            ]
-        )    
-
-    def text_detection(self, image_path):
-        results = self.det_model(image_path, verbose=False)[0]
-        return(
-            results.boxes.xyxy.tolist(),
-            results.boxes.cls.tolist(),
-            results.names,
-            results.boxes.conf.tolist(),
-        )
-
-    def text_recognition(self, img):
-        transformed_img = self.transform(img).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            prediction = self.reg_model(transformed_img).cpu()
-        text = self.decode_prediction(prediction.permute(1, 0, 2).argmax(2), IDX_TO_CHAR)
-        return text
-    
+    @app.get("/metrics")
+    async def prometheus_metrics(self):
+        """OCR and Serve metrics of every replica, in Prometheus text format."""
+        return Response(
+            content=await scrape_metrics(), media_type="text/plain; version=0.0.4"
+        )
+
+    @app.post("/ocr/batch")
+    async def ocr_batch(
+        self,
+        request: Request,
+        files: List[UploadFile] = File(...),
+        dpi: int = Query(DOCUMENT_DPI, ge=36, le=600),
+    ):
+        """OCR many images, zip/tar archives of images or PDF/TIFF documents.
+
+        One NDJSON line is streamed per page as soon as it finishes, so
+        results arrive out of order and carry their ``page`` index.
+        """
+        ticket = await self.admit(request)
+        return AdmittedStreamingResponse(
+            self.stream_pages(self.upload_pages(files, dpi)),
+            self.admission,
+            ticket,
+            media_type="application/x-ndjson",
+        )
+
+    async def upload_pages(self, files, dpi):
+        """Yield the pages of every uploaded file, expanding archives and documents."""
+        for file in files:
+            images = iter_upload_images(file.filename, await file.read(), MAX_UPLOAD_BYTES)
+            try:
+                for name, image_data in images:
+                    if is_multipage(image_data):
+                        async for page in self.document_pages(name, image_data, dpi):
+                            yield page
+                    else:
+                        yield {"name": name, "image_data": image_data}
+            except ValueError as e:
+                # an oversized member ends its archive; the other files go on
+                yield {"name": file.filename, "error": f"{e}"}
+
+    async def document_pages(self, name, data, dpi):
+        """Yield the pages of a PDF or multi-page TIFF, rasterized one at a time."""
+        document_digest = hashlib.sha256(data).hexdigest()
+        pages = aiter_document_pages(data, dpi)
+        index = 0
+        while True:
+            timings = {}
+            started_at = time.perf_counter()
+            try:
+                image = await pages.__anext__()
+            except StopAsyncIteration:
+                return
+            except ValueError as e:
+                self.stage_metrics.errors.inc(tags={"stage": "decode"})
+                yield {"name": name, "error": f"{e}"}
+                return
+            # rasterizing is this page's decode stage
+            timings["decode"] = round((time.perf_counter() - started_at) * 1000, 2)
+            self.stage_metrics.latency.observe(timings["decode"], tags={"stage": "decode"})
 
+            index += 1
+            yield {
+                "name": f"{name}#page={index}",
+                "image": image,
+                "content_id": f"{document_digest}:{index}:{dpi}".encode(),
+                "timings": timings,
+            }
 
+    async def stream_pages(self, pages):
+        """Run pages through the pipeline, yielding one NDJSON line per page.
 
-    def process_image(self, image_path:str):
+        ``pages`` is an async iterable of dicts with a ``name`` and either
+        ``image_data`` bytes or a decoded ``image``. At most
+        ``BULK_MAX_CONCURRENCY`` pages are in flight and the next one is only
+        pulled once a slot frees up, so memory stays flat however many pages
+        a document has.
+        """
+        semaphore = asyncio.Semaphore(BULK_MAX_CONCURRENCY)
+        results = asyncio.Queue()
+        tasks = []
+
+        async def run_page(index, page):
+            try:
+                result = {"page": index, "name": page["name"]}
+                timings = page.get("timings", {})
+                started_at = time.perf_counter()
+                try:
+                    if "error" in page:
+                        raise ValueError(page["error"])
+                    result["predictions"], result["model_version"] = await self.run_ocr(
+                        page.get("image_data"),
+                        page.get("image"),
+                        timings,
+                        content_id=page.get("content_id"),
+                    )
+                except Exception as e:
+                    # a failed page is reported without failing the batch
+                    result["error"] = f"{e}"
+                timings["total"] = round((time.perf_counter() - started_at) * 1000, 2)
+                result["timings_ms"] = timings
+                await results.put(result)
+            finally:
+                semaphore.release()
+
+        async def produce():
+            try:
+                index = 0
+                async for page in pages:
+                    await semaphore.acquire()
+                    tasks.append(asyncio.create_task(run_page(index, page)))
+                    index += 1
+                await asyncio.gather(*tasks)
+            finally:
+                await results.put(None)
+
+        producer = asyncio.create_task(produce())
         try:
-            bboxes, classes, names, confs = self.text_detection(image_path)
+            while True:
+                result = await results.get()
+                if result is None:
+                    break
+                yield json.dumps(result) + "\n"
+            # surface a failure to read the uploads
+            await producer
+        finally:
+            producer.cancel()
+            for task in tasks:
+                task.cancel()
 
-            image = Image.open(image_path)
-            predictions = []
 
-            for bbox, cls_idx, conf in zip(bboxes, classes, confs):
-                if cls_idx == 0:
-                    continue
-                
-                x1, y1, x2, y2 = bbox
-                name = names[int(cls_idx)]
-                cropped_image = image.crop((x1, y1, x2, y2))
-                text = self.text_recognition(cropped_image)
-                predictions.append(
-                    {
-                        "bbox": bbox,
-                        "class": name,
-                        "confidence": conf,
-                        "text": text,
-                    }
+
+@serve.deployment
+class TextDetector:
+    def __init__(
+        self,
+        det_model,
+        model_version="",
+        max_batch_size=MAX_BATCH_SIZE,
+        batch_wait_timeout_ms=BATCH_WAIT_TIMEOUT_MS,
+        tile_size=DETECTION_TILE_SIZE,
+        tile_overlap=DETECTION_TILE_OVERLAP,
+        tiling_threshold=DETECTION_TILING_THRESHOLD,
+    ):
+        started_at = time.perf_counter()
+        self.cpu_profile = apply_cpu_profile()
+        # batches run here, so the event loop keeps taking requests meanwhile
+        self.model_thread = model_executor("ocr-detect")
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        # weights are mapped from the object store, shared by every replica
+        self.det_model = materialize(det_model, self.device)
+        self.shared_model = det_model
+        self.model_version = model_version
+        self.swap_lock = asyncio.Lock()
+        self.batch_metrics = BatchMetrics()
+        self.stage_metrics = StageMetrics()
+        self.tiling = {}
+        self.configure(
+            {
+                "max_batch_size": max_batch_size,
+                "batch_wait_timeout_ms": batch_wait_timeout_ms,
+                "tile_size": tile_size,
+                "tile_overlap": tile_overlap,
+                "tiling_threshold": tiling_threshold,
+            }
+        )
+        # the replica only reports healthy once __init__ returns, so traffic
+        # never hits a cold predictor
+        self.warmup()
+        self.startup = report_startup("detector", started_at)
+
+    def __del__(self):
+        # Serve calls this on graceful shutdown
+        release_module(getattr(self, "shared_model", None))
+
+    def warmup(self, det_model=None):
+        """Set up the YOLO predictor and run one inference on a blank image."""
+        self.text_detection_batch(
+            [np.zeros((*WARMUP_IMAGE_SIZE, 3), dtype=np.uint8)], det_model
+        )
+
+    async def reconfigure(self, config):
+        """Apply a Serve ``user_config``, switching weights on ``model_version``."""
+        self.configure(config)
+        if "model_version" in config:
+            await self.load_version(config["model_version"])
+
+    async def load_version(self, version):
+        """Switch to ``version`` of the text detector from the model registry.
+
+        The new weights are loaded and warmed up in a thread while the
+        current ones keep serving; each batch holds on to the model it
+        started with.
+        """
+        async with self.swap_lock:
+            model_version = await asyncio.to_thread(resolve, TEXT_DETECTION, version)
+            if model_version.version == self.model_version:
+                return
+            started_at = time.perf_counter()
+            det_model = await asyncio.to_thread(self.prepare_model, model_version)
+            self.det_model, self.model_version = det_model, model_version.version
+            release_module(self.shared_model)
+            self.shared_model = None
+            logger.info(
+                f"Text detector switched to {model_version.version} "
+                f"in {time.perf_counter() - started_at:.1f}s"
+            )
+
+    def prepare_model(self, model_version):
+        det_model = load_model(model_version)
+        det_model.to(self.device)
+        self.warmup(det_model)
+        return det_model
+
+    def configure(self, config):
+        if "max_batch_size" in config:
+            self.detect_batch.set_max_batch_size(int(config["max_batch_size"]))
+        if "batch_wait_timeout_ms" in config:
+            self.detect_batch.set_batch_wait_timeout_s(
+                float(config["batch_wait_timeout_ms"]) / 1000
+            )
+        tiling = dict(self.tiling)
+        for key in ("tile_size", "tile_overlap", "tiling_threshold"):
+            if key in config:
+                tiling[key] = int(config[key])
+        # a bad user_config is refused and the current tiling kept
+        check_tiling(tiling["tile_size"], tiling["tile_overlap"], tiling["tiling_threshold"])
+        self.tiling = tiling
+
+    async def detect(self, image):
+        """Return the ``(bbox, class name, confidence)`` text boxes of an image.
+
+        The boxes come with the queue wait and detection time, in ms, and the
+        model version that found them.
+        """
+        return await self.detect_batch((time.perf_counter(), image))
+
+    @serve.batch(
+        max_batch_size=MAX_BATCH_SIZE,
+        batch_wait_timeout_s=BATCH_WAIT_TIMEOUT_MS / 1000,
+    )
+    async def detect_batch(self, requests):
+        """Run YOLO once over the images of concurrent calls."""
+        started_at = time.perf_counter()
+        self.batch_metrics.observe([enqueued_at for enqueued_at, _ in requests])
+        det_model, model_version = self.det_model, self.model_version
+        timings = {}
+        try:
+            # failures are counted per request by the ingress
+            with self.stage_metrics.time(timings, "detect", count_errors=False):
+                detections = await run_in(
+                    self.model_thread,
+                    self.text_detection_batch,
+                    [image for _, image in requests],
+                    det_model,
                 )
-            return predictions
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"{e}")
-    
-    def draw_predictions(self, image, predictions):
-        image_array = np.array(image)
-        annotator = Annotator(image_array, font="Arial.ttf", pil=False)
-        for prediction in predictions:
-            bbox = prediction["bbox"]
-            text = prediction["text"]
-            ###
-            color = colors(prediction["class"])
-            label = f"{prediction['class'][:3]}{prediction['confidence']:.2f}: {text}"
-            annotator.box_label(bbox, label, color=color)
-        return Image.fromarray(annotator.result)
-    
-    def decode_prediction(self, encoded_sequences, idx_to_char, blank_idx="-"):
-        decoded_sequenses = []
-        for seq in encoded_sequences:
-            decoded_seq = []
-            prev_char = None 
-            for idx in seq:
-                char = idx_to_char[int(idx)]
-                if char != blank_idx:
-                    if char != prev_char or prev_char == blank_char:
-                        decoded_seq.append(char)
-                prev_char = char # update previous character
-            decoded_sequenses.append("".join(decoded_seq))
-        return decoded_sequenses
-        
+        return [
+            (
+                boxes,
+                {"detect_queue": round((started_at - enqueued_at) * 1000, 2), **timings},
+                model_version,
+            )
+            for (enqueued_at, _), boxes in zip(requests, detections)
+        ]
 
-det_model = YOLO(TEXT_DETECTION_MODEL)
-# 
-reg_model = CRNN(
-    vocab_size=len(CHARS),
-    hidden_size=HIDDEN_SIZE,
-    n_layers=N_LAYERS,
-    dropout=DROPOUT_PROB,
-    unfreeze_layers=UNFREEZE_LAYERS,
-)
+    def text_detection(self, image):
+        return self.text_detection_batch([image])[0]
+
+    def text_detection_batch(self, images, det_model=None):
+        """Detect the text boxes of each image, tiling the very large ones."""
+        det_model = self.det_model if det_model is None else det_model
+        bgr_images = [to_bgr(image) for image in images]
+        whole = [
+            index
+            for index, image in enumerate(bgr_images)
+            if max(image.shape[:2]) <= self.tiling["tiling_threshold"]
+        ]
+
+        detections = [None] * len(images)
+        if whole:
+            results = det_model([bgr_images[index] for index in whole], verbose=False)
+            for index, result in zip(whole, results):
+                detections[index] = self.text_boxes(
+                    result.boxes.xyxy, result.boxes.cls, result.boxes.conf, result.names
+                )
+        for index, image in enumerate(bgr_images):
+            if detections[index] is None:
+                detections[index] = self.tiled_text_detection(image, det_model)
+        return detections
+
+    def tiled_text_detection(self, image, det_model=None):
+        """Detect on overlapping full-resolution tiles and merge the seams."""
+        det_model = self.det_model if det_model is None else det_model
+        tile_size = self.tiling["tile_size"]
+        tiles = tile_image(image, tile_size, self.tiling["tile_overlap"])
+
+        boxes, classes, scores, at_edge = [], [], [], []
+        names = {}
+        for start in range(0, len(tiles), DETECTION_TILE_BATCH_SIZE):
+            chunk = tiles[start:start + DETECTION_TILE_BATCH_SIZE]
+            results = det_model(
+                [tile for _, _, tile in chunk], imgsz=tile_size, verbose=False
+            )
+            for (x0, y0, tile), result in zip(chunk, results):
+                names = result.names
+                xyxy = result.boxes.xyxy
+                offset = torch.tensor([x0, y0, x0, y0], device=xyxy.device)
+                boxes.append(xyxy + offset)
+                classes.append(result.boxes.cls)
+                scores.append(result.boxes.conf)
+                at_edge.append(touches_tile_edge(xyxy, x0, y0, tile.shape, image.shape))
+
+        boxes, classes, scores = torch.cat(boxes), torch.cat(classes), torch.cat(scores)
+        keep = merge_tile_detections(
+            boxes, scores, classes.long(), torch.cat(at_edge), TILE_NMS_IOU
+        )
+        return self.text_boxes(boxes[keep], classes[keep], scores[keep], names)
+
+    @staticmethod
+    def text_boxes(xyxy, classes, scores, names):
+        """``(bbox, class name, confidence)`` tuples from whole detection tensors."""
+        return [
+            (bbox, names[cls_idx], conf)
+            for bbox, cls_idx, conf in zip(*detection_lists(xyxy, classes, scores))
+            # class 0 regions carry no text to recognize
+            if cls_idx != 0
+        ]
+
+
+@serve.deployment
+class TextRecognizer:
+    def __init__(
+        self,
+        reg_model,
+        model_version="",
+        model_config=None,
+        batch_size=RECOGNITION_BATCH_SIZE,
+        max_batch_size=MAX_BATCH_SIZE,
+        batch_wait_timeout_ms=BATCH_WAIT_TIMEOUT_MS,
+        recognition_backend=RECOGNITION_BACKEND,
+        recognition_model_path=None,
+        decoder=CTC_DECODER,
+        beam_width=CTC_BEAM_WIDTH,
+        allowed_chars=None,
+        lexicon=None,
+        width_buckets=RECOGNITION_WIDTH_BUCKETS,
+        keep_aspect_ratio=RECOGNITION_KEEP_ASPECT_RATIO,
+        crop_cache_size=CROP_CACHE_MAX_ENTRIES,
+        crop_cache_tolerance=CROP_CACHE_TOLERANCE,
+    ):
+        started_at = time.perf_counter()
+        # cropping and CTC decoding run on cpu_pool, overlapping the forward
+        # passes on model_thread; the pool gets a quarter of the CPUs, torch
+        # the rest
+        cpus = assigned_cpus()
+        workers = pool_workers(cpus)
+        self.cpu_profile = apply_cpu_profile(cpus, workers=workers)
+        self.cpu_pool = cpu_executor(workers, name="ocr-recognize-cpu")
+        self.model_thread = model_executor("ocr-recognize")
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.batch_size = batch_size
+        self.batch_metrics = BatchMetrics()
+        self.stage_metrics = StageMetrics()
+        self.configure(
+            {
+                "max_batch_size": max_batch_size,
+                "batch_wait_timeout_ms": batch_wait_timeout_ms,
+            }
+        )
+
+        # eager PyTorch, TorchScript or ONNX Runtime, all called the same way
+        self.shared_model = reg_model
+        self.recognition_backend = recognition_backend
+        self.recognizer = load_recognition_backend(
+            recognition_backend,
+            model=materialize(reg_model) if reg_model is not None else None,
+            path=recognition_model_path,
+            device=self.device,
+            num_threads=self.cpu_profile.intra_op_threads,
+        )
+        self.model_version = model_version
+        self.idx_to_char, self.blank_idx = self.alphabet(model_config or {})
+        self.swap_lock = asyncio.Lock()
 
-# Load the model weights onto the CPU
-reg_model.load_state_dict(torch.load(OCR_MODEL, map_location=torch.device('cpu')))
-reg_model.eval()
+        self.preprocessing_options = {
+            "width_buckets": tuple(sorted(width_buckets)),
+            "keep_aspect_ratio": keep_aspect_ratio,
+        }
+        self.decoder = decoder
+        self.decoder_options = {
+            "beam_width": beam_width,
+            "allowed_chars": allowed_chars,
+            "lexicon": lexicon,
+        }
+        self.warmup()
 
-## Create the service
-entrypoint = APIIngress.bind(
-    OCRHandler.bind(
-        reg_model=reg_model,
-        det_model=det_model,
+        self.crop_cache = None
+        if crop_cache_size > 0:
+            self.crop_cache = CropCache(
+                max_entries=crop_cache_size,
+                tolerance=crop_cache_tolerance,
+                hash_bits=HASH_BITS,
+            )
+        self.crop_cache_lookups = metrics.Counter(
+            "ocr_crop_cache_lookups",
+            description="Crops looked up in the recognition cache, by result.",
+            tag_keys=("result",),
+        )
+        self.crop_cache_hit_rate = metrics.Gauge(
+            "ocr_crop_cache_hit_rate",
+            description="Share of crops answered from the recognition cache since startup.",
+        )
+        self.startup = report_startup("recognizer", started_at)
+
+    def __del__(self):
+        # Serve calls this on graceful shutdown
+        release_module(getattr(self, "shared_model", None))
+
+    def warmup(self, recognizer=None):
+        """Run one blank crop per width bucket so every input shape is compiled."""
+        recognizer = self.recognizer if recognizer is None else recognizer
+        height = INPUT_SIZE[0]
+        for width in self.preprocessing_options["width_buckets"]:
+            crop = self.prepare_crop(np.zeros((height, width, 3), dtype=np.uint8))
+            recognizer(crop[None])
+
+    @staticmethod
+    def alphabet(model_config):
+        """``(class index -> char, blank index)`` of a model configuration."""
+        char_to_idx, idx_to_char = char_maps(model_config.get("chars", CHARS))
+        return idx_to_char, char_to_idx[BLANK_CHAR]
+
+    async def reconfigure(self, config):
+        """Apply a Serve ``user_config``, switching weights on ``model_version``."""
+        self.configure(config)
+        if "model_version" in config:
+            await self.load_version(config["model_version"])
+
+    async def load_version(self, version):
+        """Switch to ``version`` of the CRNN from the model registry.
+
+        Loading and warm-up run in a thread while the current weights keep
+        serving. The swap itself runs on the model thread, between two
+        batches. The crop cache is emptied with it, since its texts came
+        from the old weights.
+        """
+        async with self.swap_lock:
+            model_version = await asyncio.to_thread(resolve, TEXT_RECOGNITION, version)
+            if model_version.version == self.model_version:
+                return
+            started_at = time.perf_counter()
+            recognizer = await asyncio.to_thread(self.prepare_recognizer, model_version)
+            await run_in(self.model_thread, self.swap, recognizer, model_version)
+            release_module(self.shared_model)
+            self.shared_model = None
+            logger.info(
+                f"Text recognizer switched to {model_version.version} "
+                f"in {time.perf_counter() - started_at:.1f}s"
+            )
+
+    def swap(self, recognizer, model_version):
+        self.recognizer = recognizer
+        self.idx_to_char, self.blank_idx = self.alphabet(model_version.config)
+        self.model_version = model_version.version
+        if self.crop_cache is not None:
+            self.crop_cache.clear()
+
+    def prepare_recognizer(self, model_version):
+        model = None
+        if self.recognition_backend in ("eager", "quantized"):
+            model = load_model(model_version)
+        recognizer = load_recognition_backend(
+            self.recognition_backend,
+            model=model,
+            path=model_version.files.get(self.recognition_backend),
+            device=self.device,
+            num_threads=self.cpu_profile.intra_op_threads,
+        )
+        self.warmup(recognizer)
+        return recognizer
+
+    def configure(self, config):
+        if "max_batch_size" in config:
+            self.recognize_batch.set_max_batch_size(int(config["max_batch_size"]))
+        if "batch_wait_timeout_ms" in config:
+            self.recognize_batch.set_batch_wait_timeout_s(
+                float(config["batch_wait_timeout_ms"]) / 1000
+            )
+
+    async def recognize(self, image, bboxes):
+        """Return one ``(text, confidence)`` pair per box of ``image``.
+
+        The texts come with the preprocessing, queue wait, CRNN forward and
+        CTC decode times, in ms, and the model version that read them.
+        """
+        timings = {}
+        with self.stage_metrics.time(timings, "preprocess", count_errors=False):
+            crops = await run_in(self.cpu_pool, self.prepare_crops, image, bboxes)
+        texts, batch_timings, model_version = await self.recognize_batch(
+            (time.perf_counter(), crops)
+        )
+        timings.update(batch_timings)
+        return texts, timings, model_version
+
+    @serve.batch(
+        max_batch_size=MAX_BATCH_SIZE,
+        batch_wait_timeout_s=BATCH_WAIT_TIMEOUT_MS / 1000,
     )
-)
+    async def recognize_batch(self, requests):
+        """Recognize the crops of concurrent calls together."""
+        started_at = time.perf_counter()
+        crops = [crop for _, request_crops in requests for crop in request_crops]
+        self.batch_metrics.observe(
+            [enqueued_at for enqueued_at, _ in requests], items=len(crops)
+        )
+        timings = {}
+        try:
+            # swaps run on the model thread too, so the version cannot change
+            # under the batch
+            texts, model_version = await run_in(
+                self.model_thread, self.versioned_recognition_batch, crops, timings
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"{e}")
 
+        # split the merged results back out to each caller
+        results = []
+        start = 0
+        for enqueued_at, request_crops in requests:
+            queue_ms = round((started_at - enqueued_at) * 1000, 2)
+            results.append(
+                (
+                    texts[start:start + len(request_crops)],
+                    {"recognize_queue": queue_ms, **timings},
+                    model_version,
+                )
+            )
+            start += len(request_crops)
+        return results
+
+    def versioned_recognition_batch(self, crops, timings):
+        return self.text_recognition_batch(crops, timings), self.model_version
+
+    def text_recognition(self, crop):
+        return self.text_recognition_batch([self.prepare_crop(crop)])
+
+    def prepare_crops(self, image, bboxes):
+        return [self.prepare_crop(crop_image(image, bbox)) for bbox in bboxes]
+
+    def prepare_crop(self, crop):
+        return prepare_crop(crop, **self.preprocessing_options)
+
+    def text_recognition_batch(self, crops, timings=None):
+        """Recognize preprocessed crops with micro-batched CRNN forward passes.
+
+        Crops are grouped by width bucket and each bucket is batched on its
+        own; crops found in the crop cache skip the CRNN. A bucket is CTC
+        decoded on the CPU pool while the next one runs through the CRNN.
+        Returns one ``(text, confidence)`` pair per crop, in order;
+        ``timings`` is filled with the cache lookup, CRNN forward and CTC
+        decode times.
+        """
+        timings = {} if timings is None else timings
+        results = [None] * len(crops)
+        hits = 0
+        pending = []
+        for width, indices in bucket_by_width(crops).items():
+            batch = torch.stack([crops[index] for index in indices])
+            keys = None
+            if self.crop_cache is not None:
+                with self.stage_metrics.time(timings, "crop_cache", count_errors=False):
+                    quantized = quantize_crops(batch)
+                    keys = [(width, digest) for digest in crop_digests(quantized)]
+                    phashes = (
+                        crop_hashes(batch) if self.crop_cache.fuzzy else [None] * len(keys)
+                    )
+                    cached = [
+                        self.crop_cache.get(key, crop, phash)
+                        for key, crop, phash in zip(keys, quantized, phashes)
+                    ]
+                misses = [position for position, result in enumerate(cached) if result is None]
+                for index, result in zip(indices, cached):
+                    results[index] = result
+                hits += len(indices) - len(misses)
+                if not misses:
+                    continue
+                if len(misses) < len(indices):
+                    batch = batch[misses]
+                    indices = [indices[position] for position in misses]
+                    keys = [keys[position] for position in misses]
+                    quantized = quantized[misses]
+                    phashes = [phashes[position] for position in misses]
+
+            outputs = []
+            for start in range(0, batch.size(0), self.batch_size):
+                with self.stage_metrics.time(timings, "recognize", count_errors=False):
+                    outputs.append(self.recognizer(batch[start:start + self.batch_size]))
+
+            # CRNN returns (T, B, C), so micro-batches are joined on dim 1
+            decoding = self.cpu_pool.submit(self.timed_decode, torch.cat(outputs, dim=1))
+            if keys is None:
+                pending.append((indices, None, decoding))
+            else:
+                pending.append((indices, list(zip(keys, quantized, phashes)), decoding))
+
+        for indices, entries, decoding in pending:
+            decoded, decode_timings = decoding.result()
+            timings["ctc_decode"] = round(
+                timings.get("ctc_decode", 0) + decode_timings["ctc_decode"], 2
+            )
+            for position, (index, result) in enumerate(zip(indices, decoded)):
+                results[index] = result
+                if entries is not None:
+                    key, crop, phash = entries[position]
+                    self.crop_cache.set(key, result, crop, phash)
+
+        if self.crop_cache is not None and crops:
+            # Ray counters only take positive increments
+            if hits:
+                self.crop_cache_lookups.inc(hits, tags={"result": "hit"})
+            if hits < len(crops):
+                self.crop_cache_lookups.inc(len(crops) - hits, tags={"result": "miss"})
+            self.crop_cache_hit_rate.set(self.crop_cache.hit_rate)
+        return results
 
+    def timed_decode(self, log_probs):
+        # runs on the CPU pool, so it times into its own dict
+        timings = {}
+        with self.stage_metrics.time(timings, "ctc_decode", count_errors=False):
+            decoded = self.decode_prediction(log_probs)
+        return decoded, timings
 
+    def decode_prediction(self, log_probs):
+        """Decode ``(T, B, C)`` CRNN log-probabilities into ``(text, confidence)`` pairs."""
+        if self.decoder == "beam":
+            return beam_search_decode(
+                log_probs, self.idx_to_char, self.blank_idx, **self.decoder_options
+            )
+        return greedy_decode(log_probs, self.idx_to_char, self.blank_idx)
 
 
+def build_pipeline(
+    det_model,
+    reg_model,
+    detector_version="",
+    recognizer_version="",
+    recognizer_config=None,
+    recognition_model_path=None,
+    detector_replicas=None,
+    recognizer_replicas=None,
+    object_detection_version=None,
+):
+    """Bind the ingress over independently scaled detector and recognizer stages.
 
+    ``detector_replicas`` / ``recognizer_replicas`` pin a fixed replica count
+    instead of autoscaling on queue depth. The model weights are put in the
+    object store once instead of being pickled into every replica.
+    ``recognizer_config`` is the CRNN build configuration of ``reg_model``
+    and ``recognition_model_path`` its exported file for the configured
+    backend, by default the pre-registry export. With an
+    ``object_detection_version`` the object detector is deployed too, for
+    ``/analyze``.
+    """
+    if recognition_model_path is None:
+        recognition_model_path = LEGACY_MODELS[TEXT_RECOGNITION][2].get(RECOGNITION_BACKEND)
 
+    # fuse Conv+BN up front, otherwise each replica fuses into private memory
+    det_model.fuse()
+    det_model = share_module(det_model, TEXT_DETECTION)
+    reg_model = share_module(reg_model, TEXT_RECOGNITION)
 
+    detector = TextDetector.options(
+        **deployment_options(
+            "OCR_DETECTOR",
+            num_replicas=detector_replicas,
+            max_ongoing_requests=2 * MAX_BATCH_SIZE,
+            max_queued_requests=STAGE_MAX_QUEUED_REQUESTS,
+            **DETECTOR_OPTIONS,
+        )
+    ).bind(
+        det_model,
+        model_version=detector_version,
+        max_batch_size=MAX_BATCH_SIZE,
+        batch_wait_timeout_ms=BATCH_WAIT_TIMEOUT_MS,
+    )
+    recognizer = TextRecognizer.options(
+        **deployment_options(
+            "OCR_RECOGNIZER",
+            num_replicas=recognizer_replicas,
+            max_ongoing_requests=2 * MAX_BATCH_SIZE,
+            max_queued_requests=STAGE_MAX_QUEUED_REQUESTS,
+            **RECOGNIZER_OPTIONS,
+        )
+    ).bind(
+        reg_model,
+        model_version=recognizer_version,
+        model_config=recognizer_config,
+        batch_size=RECOGNITION_BATCH_SIZE,
+        max_batch_size=MAX_BATCH_SIZE,
+        batch_wait_timeout_ms=BATCH_WAIT_TIMEOUT_MS,
+        recognition_backend=RECOGNITION_BACKEND,
+        recognition_model_path=recognition_model_path,
+    )
+    object_detector = None
+    if object_detection_version is not None:
+        object_detector = ObjectDetectionHandler.options(
+            **deployment_options(
+                "OCR_OBJECT_DETECTOR",
+                max_queued_requests=STAGE_MAX_QUEUED_REQUESTS,
+                **OBJECT_DETECTOR_OPTIONS,
+            )
+        ).bind(object_detection_version)
+    return APIIngress.bind(
+        detector,
+        recognizer,
+        detector_version=detector_version,
+        recognizer_version=recognizer_version,
+        object_detector=object_detector,
+    )
 
 
+def build_app(args):
+    """Ray Serve application builder: load the models and bind the pipeline.
 
+    Nothing is loaded when this module is imported, only when Serve builds
+    the application, e.g. ``serve run app.api.v1.endpoints.ocr:build_app``.
+    ``args`` may pick registry versions with ``text_detection_version`` and
+    ``text_recognition_version``, or point ``text_detection_model`` and
+    ``ocr_model`` at unregistered weight files. ``analyze_objects`` turns
+    the object detector for ``/analyze`` on or off.
+    """
+    if "text_detection_model" in args:
+        detection = legacy_version(TEXT_DETECTION, args["text_detection_model"])
+    else:
+        detection = resolve(
+            TEXT_DETECTION, args.get("text_detection_version", TEXT_DETECTION_VERSION)
+        )
+    if "ocr_model" in args:
+        recognition = legacy_version(TEXT_RECOGNITION, args["ocr_model"])
+    else:
+        recognition = resolve(
+            TEXT_RECOGNITION, args.get("text_recognition_version", TEXT_RECOGNITION_VERSION)
+        )
 
+    return build_pipeline(
+        load_model(detection),
+        load_model(recognition),
+        detector_version=detection.version,
+        recognizer_version=recognition.version,
+        recognizer_config=recognition.config,
+        recognition_model_path=recognition.files.get(RECOGNITION_BACKEND),
+        object_detection_version=(
+            OBJECT_DETECTION_VERSION if args.get("analyze_objects", ANALYZE_OBJECTS) else None
+        ),
+    )
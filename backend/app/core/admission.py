@@ -0,0 +1,303 @@
+"""Admission control and load shedding for the OCR ingress.
+
+Every OCR request holds one of ``max_in_flight`` slots while it runs. Past
+that, requests wait in a bounded queue, and requests that would wait longer
+than the latency SLO are refused immediately instead of timing out later:
+
+- 429 when the client already has ``max_per_client`` requests in flight
+  (see ``client_id`` for who counts as a client)
+- 503 when the queue is full, the estimated wait exceeds the SLO, or the
+  wait actually does
+
+The wait estimate is the queue position times an EWMA of how long admitted
+requests hold their slot, divided by the number of slots. Refusals carry
+``Retry-After`` set from the same estimate.
+"""
+import asyncio
+import ipaddress
+import math
+import time
+from collections import namedtuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from ray.serve import metrics
+
+MAX_IN_FLIGHT = 64
+MAX_QUEUED = 256
+MAX_PER_CLIENT = 32
+LATENCY_SLO_MS = 5000
+# weight of the newest sample in the service time EWMA
+SERVICE_TIME_ALPHA = 0.2
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+
+Ticket = namedtuple("Ticket", ["client", "admitted_at"])
+
+
+class Overloaded(Exception):
+    """A request was shed; ``status_code`` and ``retry_after_s`` are the answer to give."""
+
+    def __init__(self, message, status_code=503, retry_after_s=1.0):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after_s = retry_after_s
+
+    @property
+    def headers(self):
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after_s)))}
+
+
+def parse_networks(spec):
+    """``ip_network``s of a comma-separated list of addresses and CIDRs."""
+    return tuple(
+        ipaddress.ip_network(item.strip(), strict=False) for item in spec.split(",") if item.strip()
+    )
+
+
+def _trusted(address, networks):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_id(request, trusted_proxies=()):
+    """The client a request counts against.
+
+    The peer address, unless the peer is one of ``trusted_proxies``: then
+    ``X-Forwarded-For`` is read from the right, skipping the trusted hops,
+    and the first untrusted address is the client.
+    """
+    peer = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("x-forwarded-for")
+    if not forwarded or not _trusted(peer, trusted_proxies):
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop, trusted_proxies):
+            return hop
+    return hops[0] if hops else peer
+
+
+class AdmissionMetrics:
+    def __init__(self):
+        self.shed = metrics.Counter(
+            "ocr_admission_shed",
+            description="Requests refused by admission control, by reason.",
+            tag_keys=("reason",),
+        )
+        self.queued = metrics.Counter(
+            "ocr_admission_queued",
+            description="Requests that had to wait for a slot.",
+        )
+        self.queue_depth = metrics.Gauge(
+            "ocr_admission_queue_depth",
+            description="Requests currently waiting for a slot.",
+        )
+        self.in_flight = metrics.Gauge(
+            "ocr_admission_in_flight",
+            description="Requests currently holding a slot.",
+        )
+        self.queue_wait = metrics.Histogram(
+            "ocr_admission_queue_wait_ms",
+            description="Time an admitted request waited for a slot.",
+            boundaries=[1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000],
+        )
+
+
+class AdmissionController:
+    """Bounded in-flight requests with per-client limits and SLO-based shedding.
+
+    Must be created on the event loop it is used from.
+    """
+
+    def __init__(
+        self,
+        max_in_flight=MAX_IN_FLIGHT,
+        max_queued=MAX_QUEUED,
+        max_per_client=MAX_PER_CLIENT,
+        slo_ms=LATENCY_SLO_MS,
+        alpha=SERVICE_TIME_ALPHA,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.max_per_client = max_per_client
+        self.slo_s = slo_ms / 1000
+        self.alpha = alpha
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.queued = 0
+        self.clients = {}
+        # EWMA of the time a request holds its slot; None until one finishes
+        self.service_s = None
+        self.metrics = AdmissionMetrics()
+
+    def estimated_wait_s(self):
+        """Expected wait for a slot of a request arriving now."""
+        if self.in_flight < self.max_in_flight:
+            return 0.0
+        return (self.service_s or 0.0) * (self.queued + 1) / self.max_in_flight
+
+    async def acquire(self, client):
+        """Wait for a slot and return the ``Ticket`` to release; raise ``Overloaded`` to shed."""
+        if self.clients.get(client, 0) >= self.max_per_client:
+            raise self._shed(
+                "client_limit",
+                f"Too many concurrent requests from {client}",
+                429,
+                self.service_s or 1.0,
+            )
+        wait_s = self.estimated_wait_s()
+        if self.queued >= self.max_queued:
+            raise self._shed("queue_full", "Server busy, request queue full", 503, wait_s)
+        if wait_s > self.slo_s:
+            raise self._shed(
+                "slo", f"Server busy, estimated wait {wait_s:.1f}s", 503, wait_s
+            )
+
+        self.clients[client] = self.clients.get(client, 0) + 1
+        started_at = time.perf_counter()
+        if self.slots.locked():
+            await self._wait_in_queue(client)
+        else:
+            # a slot is free, acquire() returns without suspending
+            await self.slots.acquire()
+
+        admitted_at = time.perf_counter()
+        self.metrics.queue_wait.observe((admitted_at - started_at) * 1000)
+        self.in_flight += 1
+        self.metrics.in_flight.set(self.in_flight)
+        return Ticket(client, admitted_at)
+
+    def release(self, ticket, observe=True):
+        """Give back the slot of ``ticket``.
+
+        ``observe=False`` leaves the service time estimate alone, for
+        streamed bulk requests that hold one slot for many pages.
+        """
+        self.in_flight -= 1
+        self.metrics.in_flight.set(self.in_flight)
+        self.slots.release()
+        self._leave(ticket.client)
+        if observe:
+            held_s = time.perf_counter() - ticket.admitted_at
+            self.service_s = (
+                held_s
+                if self.service_s is None
+                else self.alpha * held_s + (1 - self.alpha) * self.service_s
+            )
+
+    async def _wait_in_queue(self, client):
+        self.metrics.queued.inc()
+        self.queued += 1
+        self.metrics.queue_depth.set(self.queued)
+        # not asyncio.wait_for: before Python 3.12 it can time out after the
+        # semaphore was acquired and leak the permit
+        acquire = asyncio.ensure_future(self.slots.acquire())
+        try:
+            await asyncio.wait({acquire}, timeout=self.slo_s)
+        except BaseException:
+            # the client went away while queued
+            self._abandon(acquire)
+            self._leave(client)
+            raise
+        finally:
+            self.queued -= 1
+            self.metrics.queue_depth.set(self.queued)
+
+        if not acquire.done():
+            self._abandon(acquire)
+            self._leave(client)
+            raise self._shed(
+                "timeout",
+                "Server busy, timed out waiting for a slot",
+                503,
+                max(self.estimated_wait_s(), self.slo_s),
+            )
+
+    def _abandon(self, acquire):
+        if acquire.done() and not acquire.cancelled():
+            self.slots.release()
+        else:
+            # Semaphore.acquire hands the permit on if it is cancelled after winning it
+            acquire.cancel()
+
+    def _leave(self, client):
+        remaining = self.clients.get(client, 0) - 1
+        if remaining > 0:
+            self.clients[client] = remaining
+        else:
+            self.clients.pop(client, None)
+
+    def _shed(self, reason, message, status_code, retry_after_s):
+        self.metrics.shed.inc(tags={"reason": reason})
+        return Overloaded(message, status_code, retry_after_s)
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """A streamed response holding an admission ``ticket`` until it has been sent.
+
+    The ticket is released around the response's own ``__call__``, not in
+    the body generator, whose ``finally`` never runs when the client goes
+    away before the body is iterated.
+    """
+
+    def __init__(self, content, admission, ticket, **kwargs):
+        super().__init__(content, **kwargs)
+        self.admission = admission
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # bulk requests hold one slot for many pages, keep them out of
+            # the service time estimate
+            self.admission.release(self.ticket, observe=False)
+
+
+class MaxBodySizeMiddleware:
+    """ASGI middleware answering 413 to request bodies over ``max_bytes``.
+
+    A declared ``Content-Length`` is checked before anything is read;
+    otherwise the body is counted as it streams in and the request fails as
+    soon as it crosses the limit, before the rest is buffered.
+    """
+
+    def __init__(self, app, max_bytes=MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body larger than {self.max_bytes} bytes"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 413,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+                }
+            )
+            await send({"type": "http.response.body", "body": detail.encode()})
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPExceptions from body parsing as is
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,265 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(*paths, length=16):
+    """Short sha256 over the contents of ``paths``, used as a weights version."""
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        except OSError:
+            # weights not present on this node, fall back to the path itself
+            digest.update(str(path).encode())
+    return digest.hexdigest()[:length]
+
+
+class LRUCache:
+    """In-process LRU cache with a maximum entry count, an optional byte budget and a TTL.
+
+    With ``max_bytes``, every ``set`` says how large its value is and the
+    least recently used entries are evicted until the total fits.
+    """
+
+    def __init__(self, max_entries=1024, ttl_s=3600.0, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None or self._expired(entry[0]):
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, size=0):
+        if key in self._entries:
+            self._remove(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic(), value, size)
+        self.size_bytes += size
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self.size_bytes > self.max_bytes
+        ):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.size_bytes -= evicted_size
+
+    def clear(self):
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self.size_bytes -= size
+
+    def _expired(self, stored_at):
+        return self.ttl_s is not None and time.monotonic() - stored_at > self.ttl_s
+
+
+class CropCache:
+    """LRU of recognition results keyed by an exact digest of each crop.
+
+    Keys are ``(bucket_width, digest)`` pairs over the quantized crop (see
+    ``app.models.preprocessing.crop_digests``), so only pixel-identical crops
+    share a result. With ``tolerance`` > 0, a crop that misses may also
+    match a stored crop of the same width whose perceptual hash is within
+    ``tolerance`` differing bits, but only once the two crops are confirmed
+    to differ by at most ``max_diff`` levels on every pixel: hashes alone
+    cannot tell "1234.56" from "1284.56". Hashes are split into
+    ``tolerance + 1`` chunks indexed separately; two hashes that close must
+    agree on at least one whole chunk, so only the entries sharing a chunk
+    are compared.
+    """
+
+    def __init__(self, max_entries=16384, tolerance=0, hash_bits=512, max_diff=24):
+        self.max_entries = max_entries
+        self.tolerance = tolerance
+        self.max_diff = max_diff
+        self.chunk_bits = -(-hash_bits // (tolerance + 1))
+        self.hits = 0
+        self.misses = 0
+        # key -> (value, perceptual hash, quantized crop); the last two only
+        # when fuzzy
+        self._entries = OrderedDict()
+        self._index = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def fuzzy(self):
+        return self.tolerance > 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key, crop=None, phash=None, default=None):
+        """Result stored for ``key``, or for a confirmed near match of ``crop`` when fuzzy."""
+        match = key if key in self._entries else None
+        if match is None and self.fuzzy and phash is not None:
+            match = self._nearest(key[0], crop, phash)
+        if match is None:
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(match)
+        self.hits += 1
+        return self._entries[match][0]
+
+    def set(self, key, value, crop=None, phash=None):
+        if not self.fuzzy or phash is None:
+            crop = phash = None
+        if key not in self._entries and phash is not None:
+            for chunk in self._chunks(key[0], phash):
+                self._index.setdefault(chunk, set()).add(key)
+        self._entries[key] = (value, phash, crop)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, (_, evicted_hash, _) = self._entries.popitem(last=False)
+            if evicted_hash is None:
+                continue
+            for chunk in self._chunks(evicted[0], evicted_hash):
+                keys = self._index[chunk]
+                keys.discard(evicted)
+                if not keys:
+                    del self._index[chunk]
+
+    def clear(self):
+        self._entries.clear()
+        self._index.clear()
+
+    def _chunks(self, width, phash):
+        mask = (1 << self.chunk_bits) - 1
+        return [
+            (width, position, (phash >> (position * self.chunk_bits)) & mask)
+            for position in range(self.tolerance + 1)
+        ]
+
+    def _nearest(self, width, crop, phash):
+        candidates = []
+        for chunk in self._chunks(width, phash):
+            for candidate in self._index.get(chunk, ()):
+                _, candidate_hash, candidate_crop = self._entries[candidate]
+                distance = bin(candidate_hash ^ phash).count("1")
+                if distance <= self.tolerance:
+                    candidates.append((distance, candidate, candidate_crop))
+        for _, candidate, candidate_crop in sorted(candidates, key=lambda item: item[0]):
+            if crop is not None and self._same_pixels(crop, candidate_crop):
+                return candidate
+        return None
+
+    def _same_pixels(self, crop, other):
+        if crop.shape != other.shape:
+            return False
+        difference = np.abs(crop.astype(np.int16) - other.astype(np.int16))
+        return int(difference.max()) <= self.max_diff
+
+
+class OCRResultCache:
+    """Content-addressed OCR result cache.
+
+    Keys are a hash of the uploaded bytes plus the model version, so new
+    weights never serve stale predictions. ``model_version`` follows the
+    version the pipeline reports, so keys change once new weights roll out.
+    Lookups go to the in-process LRU first and then, if a ``session_factory``
+    is given, to the ``ocr_results`` table so hits survive restarts and are
+    shared across replicas.
+    """
+
+    def __init__(self, model_version, max_entries=1024, ttl_s=3600.0, session_factory=None):
+        self.model_version = model_version
+        self.memory = LRUCache(max_entries=max_entries, ttl_s=ttl_s)
+        self.session_factory = session_factory
+
+    def key(self, image_data: bytes, model_version=None) -> str:
+        digest = hashlib.sha256(image_data)
+        digest.update((model_version or self.model_version).encode())
+        return digest.hexdigest()
+
+    async def get(self, key):
+        """Return ``(predictions, tier)`` or ``(None, None)`` on a miss."""
+        predictions = self.memory.get(key)
+        if predictions is not None:
+            return predictions, "memory"
+
+        if self.session_factory is None:
+            return None, None
+
+        try:
+            predictions = await self._get_persisted(key)
+        except Exception as e:
+            logger.warning(f"OCR result cache lookup failed: {e}")
+            return None, None
+
+        if predictions is None:
+            return None, None
+        self.memory.set(key, predictions)
+        return predictions, "db"
+
+    async def set(self, key, predictions, model_version=None):
+        self.memory.set(key, predictions)
+        if self.session_factory is None:
+            return
+
+        try:
+            await self._set_persisted(key, predictions, model_version or self.model_version)
+        except Exception as e:
+            logger.warning(f"OCR result cache store failed: {e}")
+
+    async def _get_persisted(self, key):
+        from app.db.models import OCRResult
+
+        async with self.session_factory() as session:
+            row = await session.get(OCRResult, key)
+            if row is None:
+                return None
+            ttl_s = self.memory.ttl_s
+            if ttl_s is not None:
+                expires_at = _as_utc(row.created_at) + timedelta(seconds=ttl_s)
+                if expires_at < datetime.now(timezone.utc):
+                    return None
+            return row.predictions
+
+    async def _set_persisted(self, key, predictions, model_version):
+        from app.db.models import OCRResult
+
+        async with self.session_factory() as session:
+            await session.merge(
+                OCRResult(
+                    cache_key=key,
+                    model_version=model_version,
+                    predictions=predictions,
+                    created_at=datetime.now(timezone.utc),
+                )
+            )
+            await session.commit()
+
+
+def _as_utc(value):
+    # SQLite hands back naive datetimes even for timezone-aware columns
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
@@ -0,0 +1,150 @@
+"""CPU execution profile of the inference replicas.
+
+By default every replica's torch sizes its thread pools to all cores of the
+node, so a few replicas per node oversubscribe it. Each replica instead
+sizes its threads to ``num_cpus`` (its Ray CPU reservation), with a single
+inter-op thread. The CPU-bound steps around the model (cropping, CTC
+decoding, image decode and encode) run on a small thread pool so they
+overlap with the forward passes, which run on a thread of their own; a
+replica with such a pool gives it a quarter of its CPUs (``pool_workers``)
+and torch the rest. With ``OCR_PIN_CORES=1`` a replica is also pinned to
+``num_cpus`` cores of its own, claimed through lock files that only the
+replicas of the node honor, so pinning is off by default.
+"""
+import asyncio
+import fcntl
+import logging
+import math
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+PIN_CORES = os.getenv("OCR_PIN_CORES", "0") == "1"
+# one lock file per core; a replica holds the locks of its cores until it exits
+CORE_LOCK_DIR = os.getenv("OCR_CORE_LOCK_DIR", "/tmp/ocr-cores")
+INTER_OP_THREADS = 1
+# threads for the pre- and post-processing of the ingress
+CPU_WORKERS = int(os.getenv("OCR_CPU_WORKERS", "2"))
+# a model replica's pool gets one thread per this many of its CPUs
+CPUS_PER_POOL_WORKER = 4
+
+CPUProfile = namedtuple(
+    "CPUProfile", ["cpus", "intra_op_threads", "inter_op_threads", "workers", "cores"]
+)
+
+# open lock files of the cores this process is pinned to
+_core_locks = []
+
+
+def assigned_cpus():
+    """CPUs Ray reserved for this replica, else the cores it may run on."""
+    try:
+        import ray
+
+        cpus = ray.get_runtime_context().get_assigned_resources().get("CPU")
+        if cpus:
+            return cpus
+    except Exception:
+        # not in a Ray worker
+        pass
+    return len(available_cores())
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _lock_core(core, lock_dir):
+    f = open(os.path.join(lock_dir, f"{core}.lock"), "w")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def claim_cores(count, lock_dir=CORE_LOCK_DIR):
+    """Lock ``count`` free cores of this node for this process and return them.
+
+    Aligned blocks of adjacent cores are tried first so a replica's threads
+    share caches; otherwise any free cores are taken. Returns ``[]`` when
+    not enough cores are free. The locks go away with the process.
+    """
+    os.makedirs(lock_dir, exist_ok=True)
+    cores = available_cores()
+    candidates = [cores[start:start + count] for start in range(0, len(cores), count)]
+    candidates = [block for block in candidates if len(block) == count] + [cores]
+
+    for block in candidates:
+        locks = []
+        for core in block:
+            lock = _lock_core(core, lock_dir)
+            if lock is not None:
+                locks.append((core, lock))
+                if len(locks) == count:
+                    _core_locks.extend(lock for _, lock in locks)
+                    return [core for core, _ in locks]
+        for _, lock in locks:
+            lock.close()
+    return []
+
+
+def apply_cpu_profile(
+    cpus=None, workers=0, pin=PIN_CORES, inter_op_threads=INTER_OP_THREADS
+):
+    """Size torch's thread pools to this replica's CPUs and pin it to cores.
+
+    ``workers`` is the size of the replica's ``cpu_executor``; torch gets
+    the CPUs left over, at least one. Call once per process, before the
+    first inference: torch only accepts the inter-op thread count before
+    any inter-op work has run.
+    """
+    cpus = assigned_cpus() if cpus is None else cpus
+    threads = max(1, math.floor(cpus))
+    torch.set_num_threads(max(1, threads - workers))
+    try:
+        torch.set_num_interop_threads(inter_op_threads)
+    except RuntimeError:
+        # already set, or the pool has started
+        inter_op_threads = torch.get_num_interop_threads()
+
+    cores = []
+    if pin and hasattr(os, "sched_setaffinity"):
+        cores = claim_cores(threads)
+        if cores:
+            os.sched_setaffinity(0, cores)
+        else:
+            logger.warning(f"No {threads} free cores to pin to, running unpinned")
+
+    profile = CPUProfile(
+        cpus, torch.get_num_threads(), inter_op_threads, workers, cores
+    )
+    logger.info(f"CPU profile {profile._asdict()}")
+    return profile
+
+
+def pool_workers(cpus=None):
+    """Pool size of a model replica: a quarter of its CPUs, at least one."""
+    cpus = assigned_cpus() if cpus is None else cpus
+    return max(1, math.floor(cpus) // CPUS_PER_POOL_WORKER)
+
+
+def cpu_executor(workers=CPU_WORKERS, name="ocr-cpu"):
+    """Thread pool for the pre- and post-processing around the model."""
+    return ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=name)
+
+
+def model_executor(name="ocr-model"):
+    """Single thread the forward passes run on, one batch at a time."""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+
+async def run_in(executor, fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
@@ -0,0 +1,131 @@
+"""Multi-page PDF and TIFF uploads, rasterized one page at a time.
+
+Pages are produced by generators, so only the pages currently being
+processed are held as pixels whatever the page count; the document bytes
+themselves are already in memory as the upload.
+
+pdfium is not thread-safe, not even across documents, so every pdfium call
+in the process holds ``PDFIUM_LOCK`` and the async iterator renders all
+PDFs on the single ``PDFIUM_EXECUTOR`` thread.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+# PDF points are 1/72 inch
+PDF_POINTS_PER_INCH = 72
+DEFAULT_DPI = 150
+TIFF_MAGIC = (b"II*\x00", b"MM\x00*")
+
+PDFIUM_LOCK = threading.Lock()
+PDFIUM_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdfium")
+
+
+def is_pdf(data: bytes) -> bool:
+    return data[:1024].lstrip().startswith(b"%PDF-")
+
+
+def is_multipage(data: bytes) -> bool:
+    """True for PDFs and for TIFFs with more than one page."""
+    if is_pdf(data):
+        return True
+    if not data.startswith(TIFF_MAGIC):
+        return False
+    try:
+        with Image.open(BytesIO(data)) as image:
+            return getattr(image, "n_frames", 1) > 1
+    except (UnidentifiedImageError, OSError):
+        return False
+
+
+def iter_pdf_pages(data: bytes, dpi: int = DEFAULT_DPI):
+    """Yield each page of a PDF as an RGB ``uint8`` array rendered at ``dpi``."""
+    import pypdfium2 as pdfium
+
+    with PDFIUM_LOCK:
+        try:
+            document = pdfium.PdfDocument(data)
+        except pdfium.PdfiumError as e:
+            raise ValueError(f"Invalid PDF: {e}") from e
+        page_count = len(document)
+
+    try:
+        for index in range(page_count):
+            # the lock is not held across the yield
+            with PDFIUM_LOCK:
+                page = document[index]
+                try:
+                    bitmap = page.render(scale=dpi / PDF_POINTS_PER_INCH)
+                    image = np.asarray(bitmap.to_pil().convert("RGB"))
+                    bitmap.close()
+                finally:
+                    page.close()
+            yield image
+    finally:
+        with PDFIUM_LOCK:
+            document.close()
+
+
+def iter_tiff_pages(data: bytes, dpi: int = DEFAULT_DPI):
+    """Yield each frame of a TIFF as an RGB ``uint8`` array.
+
+    Frames that carry their resolution are resampled to ``dpi``.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Invalid TIFF: {e}") from e
+
+    with image:
+        for index in range(getattr(image, "n_frames", 1)):
+            image.seek(index)
+            frame = image.convert("RGB")
+            source_dpi = image.info.get("dpi", (None,))[0]
+            if source_dpi and round(source_dpi) != dpi:
+                scale = dpi / float(source_dpi)
+                frame = frame.resize(
+                    (max(1, round(frame.width * scale)), max(1, round(frame.height * scale))),
+                    Image.BILINEAR,
+                )
+            yield np.asarray(frame)
+
+
+def iter_document_pages(data: bytes, dpi: int = DEFAULT_DPI):
+    """Yield the pages of a PDF or multi-page TIFF as RGB arrays, lazily."""
+    if is_pdf(data):
+        return iter_pdf_pages(data, dpi)
+    return iter_tiff_pages(data, dpi)
+
+
+async def aiter_document_pages(data: bytes, dpi: int = DEFAULT_DPI):
+    """Async version of ``iter_document_pages``; pages render in a worker thread.
+
+    The next page is only rendered when the consumer asks for it, which is
+    what bounds memory: back-pressure comes from the caller. Each document
+    is stepped and closed on one thread, so closing after a cancellation
+    waits for the page being rendered instead of racing it.
+    """
+    pdf = is_pdf(data)
+    pages = iter_document_pages(data, dpi)
+    executor = (
+        PDFIUM_EXECUTOR if pdf else ThreadPoolExecutor(max_workers=1, thread_name_prefix="tiff")
+    )
+    loop = asyncio.get_running_loop()
+    done = object()
+    try:
+        while True:
+            image = await loop.run_in_executor(executor, next, pages, done)
+            if image is done:
+                return
+            yield image
+    finally:
+        # queued behind a render still running on the executor thread; not
+        # awaited, so a cancelled consumer does not wait for it
+        closing = loop.run_in_executor(executor, pages.close)
+        if not pdf:
+            executor.shutdown(wait=False)
+        closing.add_done_callback(lambda future: future.cancelled() or future.exception())
@@ -0,0 +1,137 @@
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+from .cache import LRUCache
+
+CONNECT_TIMEOUT_S = 5.0
+READ_TIMEOUT_S = 20.0
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+MAX_CONNECTIONS = 100
+MAX_CONNECTIONS_PER_HOST = 8
+
+# downloaded bodies are kept for conditional (ETag / Last-Modified) requests,
+# up to CACHE_MAX_BYTES in total
+CACHE_MAX_ENTRIES = 64
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_TTL_S = 60 * 60
+
+
+class FetchError(Exception):
+    """A remote image could not be fetched; ``status_code`` is the HTTP answer to give."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ImageFetcher:
+    """Shared async HTTP client for the URL-based endpoints.
+
+    Connections are pooled, each host gets a bounded number of concurrent
+    downloads, bodies are streamed and aborted past ``max_bytes``, and
+    repeated URLs are revalidated with conditional requests instead of
+    being downloaded again.
+    """
+
+    def __init__(
+        self,
+        max_bytes=MAX_DOWNLOAD_BYTES,
+        connect_timeout_s=CONNECT_TIMEOUT_S,
+        read_timeout_s=READ_TIMEOUT_S,
+        max_connections=MAX_CONNECTIONS,
+        max_connections_per_host=MAX_CONNECTIONS_PER_HOST,
+        cache_entries=CACHE_MAX_ENTRIES,
+        cache_bytes=CACHE_MAX_BYTES,
+        cache_ttl_s=CACHE_TTL_S,
+    ):
+        self.max_bytes = max_bytes
+        self.max_connections_per_host = max_connections_per_host
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout_s, connect=connect_timeout_s),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            follow_redirects=True,
+        )
+        self.cache = LRUCache(
+            max_entries=cache_entries, ttl_s=cache_ttl_s, max_bytes=cache_bytes
+        )
+        # host -> [semaphore, callers holding or waiting for it]; dropped once idle
+        self._host_limits = {}
+
+    async def fetch(self, url: str) -> bytes:
+        cached = self.cache.get(url)
+        headers = {}
+        if cached is not None:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        try:
+            async with self._host_limit(url):
+                async with self.client.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and cached is not None:
+                        return cached[2]
+                    if response.status_code != 200:
+                        raise FetchError(
+                            f"Fetching {url} returned HTTP {response.status_code}"
+                        )
+                    content = await self._read_body(response)
+        except httpx.TimeoutException as e:
+            raise FetchError(f"Timed out fetching {url}: {e}", status_code=504) from e
+        except (httpx.InvalidURL, httpx.UnsupportedProtocol) as e:
+            raise FetchError(f"Invalid image URL {url}: {e}") from e
+        except httpx.HTTPError as e:
+            raise FetchError(f"Error fetching {url}: {e}", status_code=502) from e
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            self.cache.set(url, (etag, last_modified, content), size=len(content))
+        return content
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _read_body(self, response):
+        content_length = response.headers.get("Content-Length", "")
+        # a malformed length is ignored, the streamed count still applies
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            raise FetchError(
+                f"Image is larger than {self.max_bytes} bytes", status_code=413
+            )
+
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > self.max_bytes:
+                raise FetchError(
+                    f"Image is larger than {self.max_bytes} bytes", status_code=413
+                )
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    @asynccontextmanager
+    async def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = [
+                asyncio.Semaphore(self.max_connections_per_host),
+                0,
+            ]
+        limit[1] += 1
+        try:
+            async with limit[0]:
+                yield
+        finally:
+            limit[1] -= 1
+            if limit[1] == 0:
+                del self._host_limits[host]
@@ -0,0 +1,114 @@
+import tarfile
+import zipfile
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+
+def decode_image(image_data: bytes) -> np.ndarray:
+    """Decode uploaded image bytes once into an RGB ``uint8`` array.
+
+    The array is what gets shipped to the Ray Serve handlers: NumPy arrays
+    travel through the object store and are read zero-copy on the replica.
+    """
+    try:
+        with Image.open(BytesIO(image_data)) as image:
+            return np.asarray(image.convert("RGB"))
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Invalid image data: {e}") from e
+
+
+# largest archive member expanded into memory; a small archive can otherwise
+# inflate to gigabytes
+MAX_ARCHIVE_MEMBER_BYTES = 50 * 1024 * 1024
+
+
+def _read_member(name, size, stream, max_bytes):
+    # the declared size of a zip entry can lie, so the read is capped too
+    if size > max_bytes:
+        raise ValueError(f"Archive member {name} is larger than {max_bytes} bytes")
+    with stream:
+        data = stream.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f"Archive member {name} is larger than {max_bytes} bytes")
+    return data
+
+
+def iter_upload_images(
+    filename: str, data: bytes, max_member_bytes: int = MAX_ARCHIVE_MEMBER_BYTES
+):
+    """Yield ``(name, bytes)`` for an upload, expanding zip and tar archives.
+
+    Anything that is not an archive is yielded as a single image; entries are
+    not decoded here so a bad page only fails that page. A member larger
+    than ``max_member_bytes`` raises ``ValueError`` before it is expanded.
+    """
+    buffer = BytesIO(data)
+    if zipfile.is_zipfile(buffer):
+        with zipfile.ZipFile(buffer) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield f"{filename}/{info.filename}", _read_member(
+                        info.filename, info.file_size, archive.open(info), max_member_bytes
+                    )
+        return
+
+    buffer.seek(0)
+    try:
+        archive = tarfile.open(fileobj=buffer, mode="r:*")
+    except tarfile.ReadError:
+        yield filename, data
+        return
+
+    with archive:
+        for member in archive:
+            if member.isfile():
+                yield f"{filename}/{member.name}", _read_member(
+                    member.name, member.size, archive.extractfile(member), max_member_bytes
+                )
+
+
+def to_bgr(image: np.ndarray) -> np.ndarray:
+    """Return a contiguous BGR copy of an RGB array, the layout YOLO expects."""
+    return np.ascontiguousarray(image[..., ::-1])
+
+
+def crop_image(image: np.ndarray, bbox) -> np.ndarray:
+    """Crop an ``xyxy`` box out of an image array, clipped to its bounds."""
+    height, width = image.shape[:2]
+    x1, y1, x2, y2 = (int(round(v)) for v in bbox)
+    x1, x2 = max(0, x1), min(width, x2)
+    y1, y2 = max(0, y1), min(height, y2)
+    return image[y1:max(y1 + 1, y2), x1:max(x1 + 1, x2)]
+
+
+IMAGE_MEDIA_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+
+def encode_image(image, image_format: str = "png", quality: int = 85) -> bytes:
+    """Encode a PIL image or RGB array as PNG, JPEG or WebP bytes.
+
+    ``quality`` only applies to the lossy formats, which are much cheaper to
+    encode than PNG for large annotated images.
+    """
+    if image_format not in IMAGE_MEDIA_TYPES:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+
+    options = {}
+    if image_format == "jpeg":
+        options = {"quality": quality}
+        image = image.convert("RGB")
+    elif image_format == "webp":
+        # method 0 is the fastest WebP encoder setting
+        options = {"quality": quality, "method": 0}
+
+    file_stream = BytesIO()
+    image.save(file_stream, format=image_format.upper(), **options)
+    return file_stream.getvalue()
@@ -0,0 +1,251 @@
+"""Persistent OCR job queue on the ``ocr_jobs`` table.
+
+The API inserts jobs; ``JobWorker`` loops in the OCR ingress, claims the next
+jobs with ``SELECT ... FOR UPDATE SKIP LOCKED`` so any number of workers can
+share the table, and runs them concurrently so the detector and recognizer
+batch them together. A claimed job holds a lease that its worker renews while
+the job runs: if the worker dies, the job becomes claimable again once the
+lease expires.
+"""
+import asyncio
+import logging
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import undefer
+
+from app.db.models import OCRJob
+
+logger = logging.getLogger(__name__)
+
+# jobs claimed by one worker at a time, i.e. the batch fed to the pipeline
+JOB_BATCH_SIZE = 8
+JOB_POLL_INTERVAL_S = 1.0
+# a running job whose lease is not renewed in time is handed to another worker
+JOB_LEASE_S = 300
+# the lease is renewed this many times per lease period while the job runs
+JOB_LEASE_RENEWALS = 3
+# retry n waits JOB_RETRY_BACKOFF_S * 2 ** (n - 1)
+JOB_RETRY_BACKOFF_S = 5
+JOB_MAX_ATTEMPTS = 3
+
+
+# what a worker needs of a claimed job, detached from the session
+ClaimedJob = namedtuple("ClaimedJob", ["id", "image", "attempts", "max_attempts"])
+
+
+class JobQueueFull(Exception):
+    """Raised by ``submit_job`` when the backlog is at its limit."""
+
+    def __init__(self, queued, retry_after_s):
+        super().__init__(f"{queued} jobs already queued")
+        self.retry_after_s = retry_after_s
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+async def queue_depth(session):
+    """Number of jobs waiting or running."""
+    return await session.scalar(
+        select(func.count()).select_from(OCRJob).where(
+            OCRJob.status.in_(("queued", "running"))
+        )
+    )
+
+
+async def submit_job(
+    session,
+    image_data,
+    filename=None,
+    priority=0,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    max_queued=None,
+):
+    """Insert a queued job and return its id; raise ``JobQueueFull`` past ``max_queued``."""
+    if max_queued is not None:
+        queued = await queue_depth(session)
+        if queued >= max_queued:
+            raise JobQueueFull(queued, retry_after_s=JOB_POLL_INTERVAL_S * 10)
+
+    now = _now()
+    job_id = str(uuid.uuid4())
+    session.add(
+        OCRJob(
+            id=job_id,
+            status="queued",
+            priority=priority,
+            filename=filename,
+            image=image_data,
+            attempts=0,
+            max_attempts=max_attempts,
+            available_at=now,
+            created_at=now,
+        )
+    )
+    await session.commit()
+    return job_id
+
+
+async def claim_jobs(session, limit=JOB_BATCH_SIZE, lease_s=JOB_LEASE_S):
+    """Lock and mark running up to ``limit`` available jobs, highest priority first."""
+    now = _now()
+    result = await session.execute(
+        select(OCRJob)
+        .options(undefer(OCRJob.image))
+        .where(
+            # queued and past its backoff, or running past its lease because
+            # the worker running it is gone
+            OCRJob.status.in_(("queued", "running")),
+            OCRJob.available_at <= now,
+        )
+        # in ix_ocr_jobs_claim order, so the claim never sorts the table
+        .order_by(OCRJob.priority.desc(), OCRJob.available_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = []
+    for job in result.scalars():
+        if job.status == "running" and job.attempts >= job.max_attempts:
+            # its last attempt took the worker down with it
+            job.status = "failed"
+            job.error = "lease expired"
+            job.finished_at = now
+            continue
+        job.status = "running"
+        job.attempts += 1
+        job.started_at = now
+        job.available_at = now + timedelta(seconds=lease_s)
+        claimed.append(ClaimedJob(job.id, job.image, job.attempts, job.max_attempts))
+    await session.commit()
+    return claimed
+
+
+async def _update_attempt(session, job, **values):
+    """Update the attempt ``job`` holds; False once the job was reclaimed."""
+    result = await session.execute(
+        update(OCRJob)
+        .where(
+            OCRJob.id == job.id,
+            OCRJob.status == "running",
+            # another worker claiming the job counts another attempt
+            OCRJob.attempts == job.attempts,
+        )
+        .values(**values)
+    )
+    await session.commit()
+    return result.rowcount > 0
+
+
+async def renew_lease(session, job, lease_s=JOB_LEASE_S):
+    """Push the lease of a running ``ClaimedJob`` forward; False once it was reclaimed."""
+    return await _update_attempt(
+        session, job, available_at=_now() + timedelta(seconds=lease_s)
+    )
+
+
+async def finish_job(session, job, predictions):
+    """Mark a ``ClaimedJob`` done; False once it was reclaimed."""
+    return await _update_attempt(
+        session, job, status="done", predictions=predictions, error=None, finished_at=_now()
+    )
+
+
+async def fail_job(session, job, error, retry=True):
+    """Requeue a ``ClaimedJob`` with exponential backoff, or mark it failed for good.
+
+    Returns False once the job was reclaimed, leaving the new attempt alone.
+    """
+    now = _now()
+    if retry and job.attempts < job.max_attempts:
+        values = {
+            "status": "queued",
+            "error": error,
+            "available_at": now
+            + timedelta(seconds=JOB_RETRY_BACKOFF_S * 2 ** (job.attempts - 1)),
+        }
+    else:
+        values = {"status": "failed", "error": error, "finished_at": now}
+    return await _update_attempt(session, job, **values)
+
+
+class JobWorker:
+    """Claims queued jobs and runs them through ``process(image_data)``."""
+
+    def __init__(
+        self,
+        session_factory,
+        process,
+        batch_size=JOB_BATCH_SIZE,
+        poll_interval_s=JOB_POLL_INTERVAL_S,
+        lease_s=JOB_LEASE_S,
+    ):
+        self.session_factory = session_factory
+        self.process = process
+        self.batch_size = batch_size
+        self.poll_interval_s = poll_interval_s
+        self.lease_s = lease_s
+
+    async def run(self):
+        while True:
+            try:
+                async with self.session_factory() as session:
+                    jobs = await claim_jobs(session, self.batch_size, self.lease_s)
+            except Exception as e:
+                logger.warning(f"OCR job claim failed: {e}")
+                jobs = []
+
+            if not jobs:
+                await asyncio.sleep(self.poll_interval_s)
+                continue
+            # run the claimed jobs together so the pipeline batches them
+            await asyncio.gather(*(self.run_job(job) for job in jobs))
+
+    async def heartbeat(self, job):
+        """Renew the lease of ``job`` until cancelled, so long jobs are not reclaimed."""
+        while True:
+            await asyncio.sleep(self.lease_s / JOB_LEASE_RENEWALS)
+            try:
+                async with self.session_factory() as session:
+                    if not await renew_lease(session, job, self.lease_s):
+                        logger.warning(f"OCR job {job.id} lost its lease")
+                        return
+            except Exception as e:
+                # the next renewal may still make it in time
+                logger.warning(f"Could not renew the lease of OCR job {job.id}: {e}")
+
+    async def process_leased(self, job):
+        """``process`` the image of ``job``, renewing its lease meanwhile."""
+        heartbeat = asyncio.create_task(self.heartbeat(job))
+        try:
+            return await self.process(job.image)
+        finally:
+            heartbeat.cancel()
+
+    async def run_job(self, job):
+        try:
+            predictions = await self.process_leased(job)
+        except ValueError as e:
+            # not an image or document: retrying will not help
+            await self._record(job, fail_job, job, f"{e}", retry=False)
+        except Exception as e:
+            logger.warning(f"OCR job {job.id} attempt {job.attempts} failed: {e}")
+            await self._record(job, fail_job, job, f"{e}", retry=True)
+        else:
+            await self._record(job, finish_job, job, predictions)
+
+    async def _record(self, job, update_job, *args, **kwargs):
+        try:
+            async with self.session_factory() as session:
+                recorded = await update_job(session, *args, **kwargs)
+        except Exception as e:
+            # the lease expires and another worker picks the job up
+            logger.warning(f"Could not record the outcome of OCR job {job.id}: {e}")
+            return
+        if not recorded:
+            logger.warning(
+                f"OCR job {job.id} attempt {job.attempts} was reclaimed, outcome dropped"
+            )
@@ -0,0 +1,116 @@
+"""Per-stage latency metrics for the OCR pipeline.
+
+Metrics go through ``ray.serve.metrics``, so the ingress and every replica
+report to Ray's Prometheus exporter on their node; ``scrape_metrics`` collects
+the OCR and Serve series from every node for the ingress ``/metrics`` route.
+"""
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import httpx
+import ray
+from ray.serve import metrics
+
+# request stages, in pipeline order
+STAGES = (
+    "upload",
+    "decode",
+    "detect",
+    "objects",
+    "preprocess",
+    "crop_cache",
+    "recognize",
+    "ctc_decode",
+    "annotate",
+    "encode",
+)
+
+# metric families served at /metrics; Ray prefixes custom metrics with ray_
+METRICS_PREFIXES = ("ray_ocr_", "ray_serve_")
+SCRAPE_TIMEOUT_S = 5
+
+
+class StageMetrics:
+    """Latency histogram and error counter per pipeline stage."""
+
+    def __init__(self):
+        self.latency = metrics.Histogram(
+            "ocr_stage_latency_ms",
+            description="Time spent in one stage of the OCR pipeline.",
+            boundaries=[0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000],
+            tag_keys=("stage",),
+        )
+        self.errors = metrics.Counter(
+            "ocr_errors",
+            description="Requests that failed, by the stage that raised.",
+            tag_keys=("stage",),
+        )
+
+    @contextmanager
+    def time(self, timings, stage, count_errors=True):
+        """Record the duration of the block in ``timings[stage]`` (ms) and the histogram.
+
+        An exception raised by the block counts as an error of ``stage``
+        unless ``count_errors`` is false, for replicas whose failures the
+        ingress already counts once per request.
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            if count_errors:
+                self.errors.inc(tags={"stage": stage})
+            raise
+        duration = round((time.perf_counter() - started_at) * 1000, 2)
+        # a stage may run more than once per request, e.g. per micro-batch
+        timings[stage] = round(timings.get(stage, 0) + duration, 2)
+        self.latency.observe(duration, tags={"stage": stage})
+
+
+def server_timing(timings):
+    """Format per-stage milliseconds as a ``Server-Timing`` header value."""
+    entries = []
+    for stage, value in timings.items():
+        if isinstance(value, (int, float)):
+            entries.append(f"{stage};dur={value}")
+        else:
+            entries.append(f'{stage};desc="{value}"')
+    return ", ".join(entries)
+
+
+async def scrape_metrics(prefixes=METRICS_PREFIXES):
+    """Prometheus text of every alive Ray node, restricted to ``prefixes``.
+
+    Families are merged across nodes so each ``# HELP`` / ``# TYPE`` header
+    appears once, with the samples of all nodes under it.
+    """
+    families = OrderedDict()
+    async with httpx.AsyncClient(timeout=SCRAPE_TIMEOUT_S) as client:
+        for node in ray.nodes():
+            if not node["Alive"]:
+                continue
+            url = f"http://{node['NodeManagerAddress']}:{node['MetricsExportPort']}/metrics"
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                # a node that cannot be scraped should not hide the others
+                continue
+
+            family = None
+            for line in response.text.splitlines():
+                if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                    family = line.split()[2]
+                    if family.startswith(prefixes):
+                        headers, _ = families.setdefault(family, ([], []))
+                        if line not in headers:
+                            headers.append(line)
+                elif line and not line.startswith("#") and family in families:
+                    families[family][1].append(line)
+
+    lines = []
+    for headers, samples in families.values():
+        lines.extend(headers)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
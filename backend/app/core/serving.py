@@ -0,0 +1,129 @@
+import logging
+import os
+import time
+
+from ray.serve import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def deployment_options(
+    prefix,
+    num_cpus=1,
+    num_gpus=0,
+    num_replicas=None,
+    min_replicas=1,
+    max_replicas=2,
+    target_ongoing_requests=2,
+    max_ongoing_requests=16,
+    max_queued_requests=-1,
+):
+    """Ray Serve ``.options()`` for one pipeline stage, overridable from the env.
+
+    Every argument can be overridden with ``<prefix>_<ARGUMENT>``, e.g.
+    ``OCR_RECOGNIZER_NUM_GPUS=1`` or ``OCR_DETECTOR_MAX_REPLICAS=8``. Replicas
+    autoscale on queue depth (``target_ongoing_requests`` queued or running
+    requests per replica) unless ``num_replicas`` pins a fixed count. Past
+    ``max_queued_requests`` waiting at a caller (-1: unbounded), calls fail
+    fast with ``BackPressureError``.
+    """
+    def env(name, default, cast):
+        value = os.getenv(f"{prefix}_{name}")
+        return cast(value) if value is not None else default
+
+    options = {
+        "ray_actor_options": {
+            "num_cpus": env("NUM_CPUS", num_cpus, float),
+            "num_gpus": env("NUM_GPUS", num_gpus, float),
+        },
+        "max_ongoing_requests": env("MAX_ONGOING_REQUESTS", max_ongoing_requests, int),
+        "max_queued_requests": env("MAX_QUEUED_REQUESTS", max_queued_requests, int),
+    }
+
+    num_replicas = env("NUM_REPLICAS", num_replicas, int)
+    if num_replicas is not None:
+        options["num_replicas"] = num_replicas
+        options["autoscaling_config"] = None
+    else:
+        options["autoscaling_config"] = {
+            "min_replicas": env("MIN_REPLICAS", min_replicas, int),
+            "max_replicas": env("MAX_REPLICAS", max_replicas, int),
+            "target_ongoing_requests": env(
+                "TARGET_ONGOING_REQUESTS", target_ongoing_requests, float
+            ),
+        }
+    return options
+
+
+class BatchMetrics:
+    """Size, item count and queue wait of the batches a ``@serve.batch`` method runs.
+
+    Ray Serve tags every metric with its deployment, so the detector and the
+    recognizer report under the same names.
+    """
+
+    def __init__(self):
+        self.batch_size = metrics.Histogram(
+            "ocr_batch_size",
+            description="Number of requests merged into one batch.",
+            boundaries=[1, 2, 4, 8, 16, 32, 64],
+        )
+        self.batch_items = metrics.Histogram(
+            "ocr_batch_items",
+            description="Number of images or text crops processed in one batch.",
+            boundaries=[1, 8, 32, 64, 128, 256, 512, 1024],
+        )
+        self.queue_wait = metrics.Histogram(
+            "ocr_batch_queue_wait_ms",
+            description="Time a request waited in the batch queue.",
+            boundaries=[1, 2, 5, 10, 25, 50, 100, 250, 500, 1000],
+        )
+
+    def observe(self, enqueued_at, items=None):
+        """Record one batch from the ``time.perf_counter()`` enqueue times of its requests."""
+        started_at = time.perf_counter()
+        self.batch_size.observe(len(enqueued_at))
+        self.batch_items.observe(len(enqueued_at) if items is None else items)
+        for timestamp in enqueued_at:
+            self.queue_wait.observe((started_at - timestamp) * 1000)
+
+
+def process_memory():
+    """Resident and proportional set size of this process, in bytes.
+
+    PSS splits pages shared with other processes (e.g. weights mapped from the
+    object store) between them, so it is the per-replica cost to compare.
+    """
+    memory = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty"):
+                    memory[name.lower()] = int(value.split()[0]) * 1024
+    except OSError:
+        # not Linux; RSS is all we can get
+        import resource
+
+        memory["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return memory
+
+
+def report_startup(stage, started_at):
+    """Log and export the cold-start time and memory of a replica."""
+    startup_s = time.perf_counter() - started_at
+    memory = process_memory()
+    logger.info(f"{stage} replica ready in {startup_s:.2f}s, memory {memory}")
+
+    metrics.Gauge(
+        "ocr_replica_startup_s",
+        description="Time from replica construction to ready, in seconds.",
+    ).set(startup_s)
+    memory_gauge = metrics.Gauge(
+        "ocr_replica_memory_bytes",
+        description="Replica memory right after start-up, by kind (rss, pss, ...).",
+        tag_keys=("kind",),
+    )
+    for kind, value in memory.items():
+        memory_gauge.set(value, tags={"kind": kind})
+    return {"startup_s": round(startup_s, 3), **memory}
@@ -1,6 +1,7 @@
-from .session import get_session
+from .session import engine, get_db
 from .models import Base
 
-def init_db():
+async def init_db():
     # Initialize the database and create tables
-    Base.metadata.create_all(bind=get_session().bind)
\ No newline at end of file
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
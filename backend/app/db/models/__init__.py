@@ -1 +1,3 @@
-# This file is intentionally left blank.
\ No newline at end of file
+from ..session import Base
+from .job import OCRJob
+from .ocr_result import OCRResult
@@ -0,0 +1,52 @@
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    func,
+    text,
+)
+from sqlalchemy.orm import deferred
+
+from ..session import Base
+
+# job lifecycle: queued -> running -> done | failed, running -> queued on retry
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+class OCRJob(Base):
+    """An OCR request queued for the background workers, with its result."""
+
+    __tablename__ = "ocr_jobs"
+
+    id = Column(String(36), primary_key=True)
+    status = Column(String(16), nullable=False, default="queued")
+    priority = Column(Integer, nullable=False, default=0)
+    filename = Column(String(255))
+    # only loaded when a worker claims the job
+    image = deferred(Column(LargeBinary, nullable=False))
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    # queued jobs are not claimed before this (retry backoff); running jobs
+    # are reclaimed after it (lease of a worker that died)
+    available_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    predictions = Column(JSON)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # the claim query: claimable jobs by priority, earliest available
+        # first, read in index order
+        Index(
+            "ix_ocr_jobs_claim",
+            text("priority DESC"),
+            "available_at",
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
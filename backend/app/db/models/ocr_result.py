@@ -0,0 +1,14 @@
+from sqlalchemy import JSON, Column, DateTime, String, func
+
+from ..session import Base
+
+
+class OCRResult(Base):
+    """Persisted OCR predictions keyed by image content and model version."""
+
+    __tablename__ = "ocr_results"
+
+    cache_key = Column(String(64), primary_key=True)
+    model_version = Column(String(64), nullable=False, index=True)
+    predictions = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -11,4 +11,7 @@ Base = declarative_base()
 
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+def get_db_url():
+    return DATABASE_URL
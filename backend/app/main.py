@@ -1,16 +1,6 @@
-import os
-import tempfile
-from io import BytesIO
-
-import numpy as np
-import requests
-from fastapi import FastAPI, File, HTTPException, UploadFile, Request
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, JSONResponse
-from PIL import Image
-from ray import serve
-from ultralytics import YOLO
-from ultralytics.utils.plotting import Annotator, colors
+from fastapi.responses import JSONResponse
 import logging
 from backend.app.api.v1.endpoints import router as api_router
 
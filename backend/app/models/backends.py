@@ -0,0 +1,76 @@
+"""Interchangeable inference backends for the CRNN recognizer.
+
+Every backend takes a ``(B, 1, H, W)`` float tensor and returns the CRNN
+log-probabilities as a ``(T, B, C)`` CPU tensor, so ``TextRecognizer`` does
+not care which one it runs.
+"""
+import torch
+
+RECOGNITION_BACKENDS = ("eager", "torchscript", "onnx", "quantized")
+
+
+class EagerBackend:
+    def __init__(self, model, device="cpu"):
+        self.device = device
+        self.model = model.to(device).eval()
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.model(batch.to(self.device)).cpu()
+
+
+class TorchScriptBackend:
+    def __init__(self, path, device="cpu"):
+        self.device = device
+        self.model = torch.jit.load(path, map_location=device).eval()
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.model(batch.to(self.device)).cpu()
+
+
+class OnnxBackend:
+    """ONNX Runtime on the CPU execution provider."""
+
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        inputs = {self.input_name: batch.detach().cpu().numpy()}
+        return torch.from_numpy(self.session.run(None, inputs)[0])
+
+
+def load_recognition_backend(name, model=None, path=None, device="cpu", num_threads=None):
+    """Build the backend called ``name``.
+
+    ``eager`` wraps ``model`` and ``quantized`` wraps an INT8 dynamically
+    quantized copy of it on the CPU; ``torchscript`` and ``onnx`` load the
+    exported file at ``path`` (see ``app.models.export``). ``num_threads``
+    sizes ONNX Runtime's thread pool; the torch backends follow
+    ``torch.set_num_threads``.
+    """
+    if name in ("eager", "quantized"):
+        if model is None:
+            raise ValueError(f"The {name} backend needs a CRNN model")
+        if name == "quantized":
+            from app.models.quantization import quantize_dynamic_crnn
+
+            return EagerBackend(quantize_dynamic_crnn(model.cpu()), "cpu")
+        return EagerBackend(model, device)
+    if path is None:
+        raise ValueError(f"The {name} backend needs an exported model path")
+    if name == "torchscript":
+        return TorchScriptBackend(path, device)
+    if name == "onnx":
+        return OnnxBackend(path, num_threads)
+    raise ValueError(
+        f"Unknown recognition backend {name!r}, expected one of {RECOGNITION_BACKENDS}"
+    )
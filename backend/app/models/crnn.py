@@ -1,14 +1,39 @@
-import timm
 import torch.nn as nn
 import torch
 
+CHARS = '0123456789abcdefghijklmnopqrstuvwxyz-'
+
+
+def char_maps(chars=CHARS):
+    """``(char -> class index, class index -> char)`` for a CRNN alphabet."""
+    char_to_idx = {char: idx + 1 for idx, char in enumerate(sorted(chars))}
+    return char_to_idx, {idx: char for char, idx in char_to_idx.items()}
+
+
+CHAR_TO_IDX, IDX_TO_CHAR = char_maps(CHARS)
+
+# model configuration
+HIDDEN_SIZE = 256
+N_LAYERS = 3
+DROPOUT_PROB = 0.2
+UNFREEZE_LAYERS = 3
+
+# recognition input size, (height, width)
+INPUT_SIZE = (100, 420)
+
 class CRNN(nn.Module):
     def __init__(
-            self, vocab_size, hidden_size, n_layers, dropout=0.2, unfreeze_layers=3
+            self, vocab_size, hidden_size, n_layers, dropout=0.2, unfreeze_layers=3,
+            pretrained=True,
     ):
         super(CRNN, self).__init__()
 
-        backbone = timm.create_model("resnet34", in_chans=1, pretrained=True)
+        # imported here so loading the serving code does not pay for timm
+        import timm
+
+        # pretrained ImageNet weights are only worth downloading for training;
+        # pass pretrained=False when a state dict is loaded afterwards
+        backbone = timm.create_model("resnet34", in_chans=1, pretrained=pretrained)
         modules = list(backbone.children())[:-2]
         modules.append(nn.AdaptiveAvgPool2d((1, None)))
         self.backbone = nn.Sequential(*modules)
@@ -33,23 +58,24 @@ class CRNN(nn.Module):
             nn.Linear(hidden_size * 2, vocab_size), nn.LogSoftmax(dim=2)
         )
 
-    @torch.autocast(device_type="cuda")
     def forward(self, x):
         # Add input validation
         if x.dim() != 4:
             raise ValueError("Expected 4D input (batch, channels, height, width)")
-            
-        # Add input normalization
-        x = x.float() / 255.0
-        
-        x = self.backbone(x)
-        x = x.permute(0, 3, 1, 2)
-        x = x.view(x.size(0), x.size(1), -1) # Flatten the feature map
-        x = self.mapSeq(x)
-        x, _ = self.gru(x)  # Fixed: Pass x to GRU
-        x = self.layer_norm(x)
-        x = self.out(x)
-        x = x.permute(1, 0, 2)  # Fixed: Changed from self.permute
+
+        # mixed precision only pays off on the GPU; keep CPU inference in fp32
+        with torch.autocast(device_type="cuda", enabled=x.is_cuda):
+            # Add input normalization
+            x = x.float() / 255.0
+
+            x = self.backbone(x)
+            x = x.permute(0, 3, 1, 2)
+            x = x.view(x.size(0), x.size(1), -1) # Flatten the feature map
+            x = self.mapSeq(x)
+            x, _ = self.gru(x)  # Fixed: Pass x to GRU
+            x = self.layer_norm(x)
+            x = self.out(x)
+            x = x.permute(1, 0, 2)  # Fixed: Changed from self.permute
 
         return x
 
@@ -61,4 +87,42 @@ class CRNN(nn.Module):
         self.eval()
 
 
+def build_crnn(
+    weights=None,
+    pretrained=False,
+    chars=CHARS,
+    hidden_size=HIDDEN_SIZE,
+    n_layers=N_LAYERS,
+    dropout=DROPOUT_PROB,
+):
+    """Build the CRNN, optionally loading weights.
+
+    The defaults are the serving configuration; versions in the model
+    registry carry their own (see ``app.models.registry``).
+    """
+    model = CRNN(
+        vocab_size=len(chars),
+        hidden_size=hidden_size,
+        n_layers=n_layers,
+        dropout=dropout,
+        unfreeze_layers=UNFREEZE_LAYERS,
+        pretrained=pretrained,
+    )
+    if weights is not None:
+        model.load_state_dict(torch.load(weights, map_location=torch.device('cpu')))
+    model.eval()
+    return model
+
+
+def build_transform():
+    """PIL crop -> normalized ``(1, H, W)`` tensor, as used for training."""
+    from torchvision import transforms
 
+    return transforms.Compose(
+        [
+            transforms.Resize(INPUT_SIZE),
+            transforms.Grayscale(num_output_channels=1),
+            transforms.ToTensor(),
+            transforms.Normalize((0.5,), (0.5,)),
+        ]
+    )
@@ -0,0 +1,124 @@
+"""CTC decoding of CRNN log-probabilities.
+
+Both decoders take the ``(T, B, C)`` log-softmax output of ``CRNN.forward``
+and return one ``(text, confidence)`` pair per sequence. Indices missing
+from ``idx_to_char`` are treated like the blank.
+"""
+from collections import defaultdict
+
+import numpy as np
+import torch
+
+BLANK_CHAR = "-"
+
+NEG_INF = -np.inf
+
+
+def _charset(idx_to_char, num_classes, blank_idx):
+    charset = np.full(num_classes, "", dtype=object)
+    for idx, char in idx_to_char.items():
+        if idx < num_classes and idx != blank_idx:
+            charset[idx] = char
+    return charset
+
+
+def greedy_decode(log_probs, idx_to_char, blank_idx):
+    """Best-path decoding over the whole batch at once.
+
+    Repeats are collapsed and blanks dropped with array ops; the confidence
+    is the geometric mean of the per-step best-path probabilities.
+    """
+    if not isinstance(log_probs, torch.Tensor):
+        log_probs = torch.as_tensor(log_probs)
+    best_log_probs, best = log_probs.max(dim=2)
+    best = best.t().cpu().numpy()
+
+    charset = _charset(idx_to_char, log_probs.size(2), blank_idx)
+    keep = charset[best] != ""
+    keep[:, 1:] &= best[:, 1:] != best[:, :-1]
+    chars = charset[best]
+
+    texts = ["".join(row[mask]) for row, mask in zip(chars, keep)]
+    confidences = best_log_probs.mean(dim=0).exp().tolist()
+    return list(zip(texts, confidences))
+
+
+def _allowed_prefixes(lexicon):
+    prefixes = set()
+    for word in lexicon:
+        for end in range(len(word) + 1):
+            prefixes.add(word[:end])
+    return prefixes
+
+
+def beam_search_decode(
+    log_probs,
+    idx_to_char,
+    blank_idx,
+    beam_width=8,
+    allowed_chars=None,
+    lexicon=None,
+):
+    """CTC prefix beam search.
+
+    ``allowed_chars`` restricts the characters that may be emitted (for
+    example digits and separators for amounts) and ``lexicon`` restricts the
+    output to prefixes of the given words; the best complete word is
+    returned, or the best surviving prefix if no beam completed one. The
+    confidence is the probability of the returned labelling normalized per
+    step, ``exp(log p / T)``, so it is on the same scale as greedy's.
+    """
+    if isinstance(log_probs, torch.Tensor):
+        log_probs = log_probs.detach().cpu().numpy()
+    charset = _charset(idx_to_char, log_probs.shape[2], blank_idx)
+    candidates = [idx for idx, char in enumerate(charset) if char]
+    if allowed_chars is not None:
+        candidates = [idx for idx in candidates if charset[idx] in allowed_chars]
+    candidates = np.array(candidates, dtype=np.int64)
+    prefixes = _allowed_prefixes(lexicon) if lexicon is not None else None
+    words = set(lexicon) if lexicon is not None else None
+
+    results = []
+    for seq in np.transpose(log_probs, (1, 0, 2)):
+        results.append(
+            _beam_search(seq, charset, blank_idx, beam_width, candidates, prefixes, words)
+        )
+    return results
+
+
+def _beam_search(seq, charset, blank_idx, beam_width, candidates, prefixes, words):
+    # prefix -> [log p(ending in blank), log p(ending in a character)]
+    beams = {"": [0.0, NEG_INF]}
+    for step in seq:
+        # only extend with the most likely characters of this step
+        top = candidates[np.argsort(step[candidates])[-beam_width:]]
+        next_beams = defaultdict(lambda: [NEG_INF, NEG_INF])
+        for prefix, (p_blank, p_char) in beams.items():
+            total = np.logaddexp(p_blank, p_char)
+            entry = next_beams[prefix]
+            entry[0] = np.logaddexp(entry[0], total + step[blank_idx])
+            for idx in top:
+                char = charset[idx]
+                source = total
+                if prefix and prefix[-1] == char:
+                    # a repeat collapses into the prefix, extending it needs a blank
+                    entry[1] = np.logaddexp(entry[1], p_char + step[idx])
+                    source = p_blank
+
+                extended = prefix + char
+                if prefixes is not None and extended not in prefixes:
+                    continue
+                new_entry = next_beams[extended]
+                new_entry[1] = np.logaddexp(new_entry[1], source + step[idx])
+
+        ranked = sorted(
+            next_beams.items(), key=lambda item: np.logaddexp(*item[1]), reverse=True
+        )
+        beams = dict(ranked[:beam_width])
+
+    ranked = sorted(beams.items(), key=lambda item: np.logaddexp(*item[1]), reverse=True)
+    if words is not None:
+        complete = [item for item in ranked if item[0] in words]
+        ranked = complete or ranked
+    text, scores = ranked[0]
+    return text, float(np.exp(np.logaddexp(*scores) / max(len(seq), 1)))
@@ -0,0 +1,24 @@
+"""Plain-Python detections from whole YOLO result tensors.
+
+Reading ``box.xyxy[0].cpu().numpy()`` per box costs a device sync and a
+small copy per field and box; converting each tensor once with ``tolist()``
+costs one per field, whatever the box count.
+"""
+
+
+def detection_lists(xyxy, classes, scores):
+    """``(boxes, class ids, confidences)`` lists from ``(N, 4)``, ``(N,)``, ``(N,)`` tensors."""
+    return xyxy.tolist(), [int(cls_idx) for cls_idx in classes.tolist()], scores.tolist()
+
+
+def result_lists(result):
+    """``detection_lists`` of one ultralytics ``Results``."""
+    return detection_lists(result.boxes.xyxy, result.boxes.cls, result.boxes.conf)
+
+
+def detection_dicts(boxes, classes, scores, names):
+    """JSON-ready ``{"bbox", "class", "confidence"}`` entries."""
+    return [
+        {"bbox": bbox, "class": names[cls_idx], "confidence": conf}
+        for bbox, cls_idx, conf in zip(boxes, classes, scores)
+    ]
@@ -0,0 +1,66 @@
+"""Export a trained CRNN state dict to TorchScript and/or ONNX.
+
+    python -m app.models.export --weights app/models/weights/ocr_crnn.pt \
+        --format onnx --output app/models/weights/ocr_crnn.onnx
+
+Both exports keep the batch and width axes dynamic, so the exported model
+accepts any number of crops of any width at the fixed input height.
+"""
+import argparse
+
+import torch
+
+from app.models.crnn import INPUT_SIZE, build_crnn
+
+ONNX_OPSET = 17
+
+
+def example_input(batch_size=2, size=INPUT_SIZE):
+    height, width = size
+    return torch.randn(batch_size, 1, height, width)
+
+
+def export_torchscript(model, output):
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input(), check_trace=False)
+    traced.save(output)
+    return output
+
+
+def export_onnx(model, output, opset=ONNX_OPSET):
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            example_input(),
+            output,
+            input_names=["images"],
+            output_names=["log_probs"],
+            dynamic_axes={
+                "images": {0: "batch", 3: "width"},
+                "log_probs": {0: "time", 1: "batch"},
+            },
+            opset_version=opset,
+        )
+    return output
+
+
+EXPORTERS = {
+    "torchscript": export_torchscript,
+    "onnx": export_onnx,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weights", help="CRNN state dict; random weights if omitted")
+    parser.add_argument("--format", choices=sorted(EXPORTERS), required=True)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    model = build_crnn(args.weights)
+    EXPORTERS[args.format](model, args.output)
+    print(f"Exported {args.format} model to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
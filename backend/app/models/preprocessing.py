@@ -0,0 +1,97 @@
+"""Recognition preprocessing on already-decoded image arrays.
+
+By default crops are stretched to the widest bucket, the fixed size the CRNN
+was trained at. With ``keep_aspect_ratio`` they keep their aspect ratio at
+the CRNN input height instead and are padded up to one of a few fixed
+widths. Crops in the same width bucket are batched together; the CRNN pools
+the height away with ``AdaptiveAvgPool2d((1, None))`` so the sequence length
+simply follows the bucket width.
+"""
+import hashlib
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from app.models.crnn import INPUT_SIZE
+
+# the widest bucket is the width the CRNN was trained at
+WIDTH_BUCKETS = (128, 192, 256, 320, 420)
+
+# ITU-R 601-2 luma, the same weights PIL uses for "L" conversion
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def prepare_crop(crop, height=INPUT_SIZE[0], width_buckets=WIDTH_BUCKETS, keep_aspect_ratio=False):
+    """RGB ``uint8`` crop -> normalized ``(1, height, bucket_width)`` tensor.
+
+    By default every crop is stretched to the widest bucket, which matches
+    the fixed-size training transform. With ``keep_aspect_ratio=True`` it
+    is resized to ``height`` and padded to the nearest bucket; narrow
+    buckets leave the CTC few steps, so check the accuracy with
+    ``benchmarks.quantization_accuracy`` before serving them.
+    """
+    if crop.ndim == 3:
+        gray = crop.astype(np.float32) @ GRAY_WEIGHTS
+    else:
+        gray = crop.astype(np.float32)
+    tensor = torch.from_numpy(gray / 255.0)[None, None]
+
+    crop_height, crop_width = gray.shape
+    max_width = width_buckets[-1]
+    width = max_width
+    if keep_aspect_ratio:
+        width = min(max_width, max(1, round(crop_width * height / crop_height)))
+    bucket = next(bucket for bucket in width_buckets if bucket >= width)
+
+    resized = F.interpolate(
+        tensor, size=(height, width), mode="bilinear", align_corners=False, antialias=True
+    )
+    if bucket > width:
+        resized = F.pad(resized, (0, bucket - width, 0, 0), mode="replicate")
+    return ((resized - 0.5) / 0.5)[0]
+
+
+def bucket_by_width(crops):
+    """Map each bucket width to the indices of the crops that have it."""
+    buckets = {}
+    for index, crop in enumerate(crops):
+        buckets.setdefault(crop.size(-1), []).append(index)
+    return buckets
+
+
+def quantize_crops(batch):
+    """``(B, H, W)`` uint8 pixel levels of a ``(B, 1, H, W)`` preprocessed batch."""
+    levels = (batch[:, 0] * 0.5 + 0.5) * 255
+    return levels.round().clamp(0, 255).to(torch.uint8).numpy()
+
+
+def crop_digests(quantized):
+    """Exact digest of each quantized crop, the crop cache key."""
+    return [hashlib.blake2b(crop.tobytes(), digest_size=16).digest() for crop in quantized]
+
+
+# perceptual hash grid: HASH_ROWS x HASH_COLS horizontal gradient signs
+HASH_ROWS = 8
+HASH_COLS = 64
+HASH_BITS = HASH_ROWS * HASH_COLS
+# gradients below this (in normalized units) hash as 0, so flat background
+# does not flip bits on noise
+HASH_GRADIENT_THRESHOLD = 0.05
+
+
+def crop_hashes(batch):
+    """Difference hash of each crop of a ``(B, 1, H, W)`` preprocessed batch.
+
+    Crops are average-pooled to a ``HASH_ROWS x (HASH_COLS + 1)`` grid and
+    every bit is whether brightness rises to the right neighbour, so
+    identical crops hash the same and re-encoded copies differ by a few
+    bits. Different text can hash the same too, so a hash only nominates
+    candidates for the crop cache to confirm. Returns one ``HASH_BITS``-bit
+    int per crop.
+    """
+    # the crops are already antialiased, every other pixel is plenty for the grid
+    grid = F.adaptive_avg_pool2d(batch[:, :, ::2, ::2], (HASH_ROWS, HASH_COLS + 1))[:, 0]
+    bits = (grid[:, :, 1:] - grid[:, :, :-1]) > HASH_GRADIENT_THRESHOLD
+    packed = np.packbits(bits.reshape(batch.size(0), -1).numpy(), axis=1)
+    return [int.from_bytes(row.tobytes(), "big") for row in packed]
@@ -0,0 +1,112 @@
+"""INT8 quantization of the CRNN for CPU-only serving.
+
+Dynamic quantization covers the GRU and Linear layers (``mapSeq``, ``out``),
+which dominate CPU time, and needs no calibration. Static quantization of
+the ResNet34 backbone additionally needs a few batches of real crops to
+calibrate activation ranges:
+
+    python -m app.models.quantization --weights app/models/weights/ocr_crnn.pt \
+        --calibration-dir crops/ --output app/models/weights/ocr_crnn_int8.ts
+
+The output is a TorchScript file, served with ``OCR_RECOGNITION_BACKEND=torchscript``.
+"""
+import argparse
+import copy
+import os
+from io import BytesIO
+
+import torch
+import torch.nn as nn
+from PIL import Image
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from app.models.crnn import build_crnn, build_transform
+from app.models.export import example_input
+
+QUANTIZED_ENGINE = "x86"
+
+
+def quantize_dynamic_crnn(model):
+    """Return a copy of ``model`` with INT8 dynamic GRU and Linear layers."""
+    return quantize_dynamic(
+        copy.deepcopy(model).eval(), {nn.GRU, nn.Linear}, dtype=torch.qint8
+    )
+
+
+def quantize_static_backbone(model, calibration_batches):
+    """Statically quantize the ResNet34 backbone of ``model`` in place.
+
+    ``calibration_batches`` are preprocessed ``(B, 1, H, W)`` crop tensors.
+    """
+    torch.backends.quantized.engine = QUANTIZED_ENGINE
+    qconfig_mapping = get_default_qconfig_mapping(QUANTIZED_ENGINE)
+
+    backbone = prepare_fx(
+        model.backbone.eval(), qconfig_mapping, (_backbone_input(example_input()),)
+    )
+    with torch.no_grad():
+        for batch in calibration_batches:
+            backbone(_backbone_input(batch))
+    model.backbone = convert_fx(backbone)
+    return model
+
+
+def _backbone_input(batch):
+    # CRNN.forward scales its input before the backbone, calibrate on the same
+    return batch.float() / 255.0
+
+
+def quantize_crnn(model, calibration_batches=None):
+    """Dynamic INT8 for the recurrent head, plus static INT8 for the backbone
+    when calibration data is given."""
+    model = quantize_dynamic_crnn(model)
+    if calibration_batches:
+        model = quantize_static_backbone(model, calibration_batches)
+    return model
+
+
+def load_calibration_batches(directory, batch_size=16, limit=256):
+    transform = build_transform()
+    names = sorted(os.listdir(directory))[:limit]
+    crops = []
+    for name in names:
+        with Image.open(os.path.join(directory, name)) as image:
+            crops.append(transform(image.convert("RGB")))
+    return [
+        torch.stack(crops[start:start + batch_size])
+        for start in range(0, len(crops), batch_size)
+    ]
+
+
+def model_size_bytes(model):
+    """Size of the serialized state dict, a proxy for resident weight memory."""
+    buffer = BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weights", help="CRNN state dict; random weights if omitted")
+    parser.add_argument("--calibration-dir", help="crop images for static backbone quantization")
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    model = build_crnn(args.weights)
+    calibration = None
+    if args.calibration_dir:
+        calibration = load_calibration_batches(args.calibration_dir)
+    quantized = quantize_crnn(model, calibration)
+
+    with torch.no_grad():
+        traced = torch.jit.trace(quantized, example_input(), check_trace=False)
+    traced.save(args.output)
+    print(
+        f"Saved INT8 model to {args.output} "
+        f"({model_size_bytes(model)} -> {model_size_bytes(quantized)} bytes)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Versioned model weights, each stored with the configuration it is built with.
+
+Every model has a directory under ``MODEL_ROOT`` with one subdirectory per
+version, holding the weights, any exported files and a ``manifest.json``:
+
+    weights/text_recognition/20240601-120000/manifest.json
+    weights/text_recognition/20240601-120000/ocr_crnn.pt
+    weights/text_recognition/20240601-120000/ocr_crnn.onnx
+
+The manifest records the model format, the weights file and its sha256, the
+exported files by backend, and the keyword arguments the model is built
+with (e.g. the CRNN alphabet and layer sizes), so a version carries
+everything needed to load it. The weights are checked against the sha256
+before they are loaded. Register one with
+
+    python -m app.models.registry register text_recognition ocr_crnn.pt --format crnn \
+        --file onnx=ocr_crnn.onnx --config '{"n_layers": 3}'
+    python -m app.models.registry list text_recognition
+
+Models with no registered version fall back to their weight file from
+before the registry, versioned by its digest.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from app.core.cache import file_digest
+
+# next to this file, whatever directory the server is started from
+WEIGHTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights")
+MODEL_ROOT = os.getenv("OCR_MODEL_ROOT", WEIGHTS_DIR)
+MANIFEST_NAME = "manifest.json"
+MODEL_FORMATS = ("yolo", "crnn")
+
+# format, weights and exported files of each model before the registry existed
+LEGACY_MODELS = {
+    "text_detection": ("yolo", os.path.join(WEIGHTS_DIR, "best.pt"), {}),
+    "text_recognition": (
+        "crnn",
+        os.path.join(WEIGHTS_DIR, "ocr_crnn.pt"),
+        {
+            "torchscript": os.path.join(WEIGHTS_DIR, "ocr_crnn.ts"),
+            "onnx": os.path.join(WEIGHTS_DIR, "ocr_crnn.onnx"),
+        },
+    ),
+    # a bare name, which ultralytics downloads
+    "object_detection": ("yolo", "yolov8n.pt", {}),
+}
+
+# ``files`` maps a backend (e.g. "onnx") to an exported file of this version;
+# ``sha256`` is the digest of the weights, None for unregistered files
+ModelVersion = namedtuple(
+    "ModelVersion",
+    ["name", "version", "format", "weights", "files", "config", "sha256"],
+    defaults=(None,),
+)
+
+
+class ModelNotFound(Exception):
+    """Raised when a model or version is not in the registry."""
+
+
+class WeightsMismatch(Exception):
+    """Raised when weights no longer match the sha256 of their manifest."""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    return manifest, ModelVersion(
+        name=manifest["name"],
+        version=manifest["version"],
+        format=manifest["format"],
+        weights=os.path.join(directory, manifest["weights"]),
+        files={
+            backend: os.path.join(directory, filename)
+            for backend, filename in manifest.get("files", {}).items()
+        },
+        config=manifest.get("config", {}),
+        sha256=manifest.get("sha256"),
+    )
+
+
+def list_versions(name, root=MODEL_ROOT):
+    """Registered versions of ``name``, oldest first."""
+    model_dir = os.path.join(root, name)
+    if not os.path.isdir(model_dir):
+        return []
+
+    manifests = []
+    for entry in os.listdir(model_dir):
+        directory = os.path.join(model_dir, entry)
+        if os.path.isfile(os.path.join(directory, MANIFEST_NAME)):
+            manifests.append(_read_manifest(directory))
+    manifests.sort(key=lambda item: (item[0].get("created_at", ""), item[1].version))
+    return [model_version for _, model_version in manifests]
+
+
+def legacy_version(name, weights=None, model_format=None):
+    """A ``ModelVersion`` for an unregistered weight file, versioned by its digest."""
+    files = {}
+    if name in LEGACY_MODELS:
+        legacy_format, legacy_weights, legacy_files = LEGACY_MODELS[name]
+        model_format = model_format or legacy_format
+        # the exports belong to the legacy weights only
+        if weights is None or weights == legacy_weights:
+            weights, files = legacy_weights, legacy_files
+    if weights is None or model_format is None:
+        raise ModelNotFound(f"Unknown model: {name}")
+    return ModelVersion(name, file_digest(weights), model_format, weights, files, {})
+
+
+def resolve(name, version="latest", root=MODEL_ROOT):
+    """The ``ModelVersion`` of ``name`` called ``version``.
+
+    ``"latest"`` is the most recently registered version, or the legacy
+    weight file when none is registered.
+    """
+    versions = list_versions(name, root)
+    if version in (None, "", "latest"):
+        return versions[-1] if versions else legacy_version(name)
+
+    for model_version in versions:
+        if model_version.version == version:
+            return model_version
+    # the legacy file is addressable by the digest it reports
+    if not versions and name in LEGACY_MODELS:
+        model_version = legacy_version(name)
+        if model_version.version == version:
+            return model_version
+    raise ModelNotFound(f"{name} has no version {version}")
+
+
+def verify_weights(model_version):
+    """Raise ``WeightsMismatch`` if the weights of a registered version were changed."""
+    if model_version.sha256 is None:
+        return
+    digest = _sha256(model_version.weights)
+    if digest != model_version.sha256:
+        raise WeightsMismatch(
+            f"{model_version.name} {model_version.version}: {model_version.weights} "
+            f"has sha256 {digest}, the manifest expects {model_version.sha256}"
+        )
+
+
+def load_model(model_version):
+    """Build the model of a ``ModelVersion`` with its weights and configuration.
+
+    Registered weights are checked against their manifest first.
+    """
+    verify_weights(model_version)
+    if model_version.format == "yolo":
+        from ultralytics import YOLO
+
+        return YOLO(model_version.weights)
+    if model_version.format == "crnn":
+        from app.models.crnn import build_crnn
+
+        # the state dict replaces the backbone weights, so skip the timm download
+        return build_crnn(model_version.weights, pretrained=False, **model_version.config)
+    raise ValueError(f"Unknown model format: {model_version.format}")
+
+
+def register(
+    name, weights, model_format, version=None, config=None, files=None, root=MODEL_ROOT
+):
+    """Copy ``weights`` (and exported ``files``) into a new version of ``name``."""
+    if model_format not in MODEL_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(MODEL_FORMATS)}")
+    created_at = datetime.now(timezone.utc)
+    version = version or created_at.strftime("%Y%m%d-%H%M%S")
+    directory = os.path.join(root, name, version)
+    if os.path.exists(directory):
+        raise ValueError(f"{name} version {version} already exists")
+
+    os.makedirs(directory)
+    shutil.copy2(weights, os.path.join(directory, os.path.basename(weights)))
+    for path in (files or {}).values():
+        shutil.copy2(path, os.path.join(directory, os.path.basename(path)))
+    manifest = {
+        "name": name,
+        "version": version,
+        "format": model_format,
+        "weights": os.path.basename(weights),
+        "sha256": _sha256(weights),
+        "files": {backend: os.path.basename(path) for backend, path in (files or {}).items()},
+        "config": config or {},
+        "created_at": created_at.isoformat(),
+    }
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return _read_manifest(directory)[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", default=MODEL_ROOT)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    register_parser = commands.add_parser("register", help="add a version of a model")
+    register_parser.add_argument("name")
+    register_parser.add_argument("weights")
+    register_parser.add_argument("--format", choices=MODEL_FORMATS, required=True)
+    register_parser.add_argument("--version", help="defaults to the current UTC time")
+    register_parser.add_argument("--config", default="{}", help="JSON build arguments")
+    register_parser.add_argument(
+        "--file", action="append", default=[], help="exported file, as BACKEND=PATH"
+    )
+
+    list_parser = commands.add_parser("list", help="show the versions of a model")
+    list_parser.add_argument("name")
+    args = parser.parse_args()
+
+    if args.command == "register":
+        files = dict(item.split("=", 1) for item in args.file)
+        model_version = register(
+            args.name,
+            args.weights,
+            args.format,
+            version=args.version,
+            config=json.loads(args.config),
+            files=files,
+            root=args.root,
+        )
+        print(f"registered {model_version.name} {model_version.version}")
+    else:
+        for model_version in list_versions(args.name, args.root):
+            print(model_version.version, model_version.weights)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Share model weights between Ray Serve replicas through the object store.
+
+Binding a model into a deployment pickles its weights into every replica, so
+memory grows linearly with the replica count. ``share_module`` puts the
+weights in the object store once, as numpy arrays, and binds a weightless
+skeleton instead. ``materialize`` runs in the replica: Ray maps the arrays
+read-only from the node's shared memory and the skeleton's tensors are pointed
+at them without a copy, so every replica on a node uses the same pages.
+
+An object lives as long as the process that owns it, and the process that
+builds the application may be short-lived (``serve deploy`` builds it in a
+controller task). The weights are therefore put by a detached
+``WeightStore`` actor, so replicas started later by autoscaling or a restart
+still find them. The store keys weights by their digest, so rebuilding with
+the same weights reuses the stored copy. It also remembers the current digest
+of every shared model and counts the replicas holding each copy: replicas
+``retain`` the weights in ``materialize`` and ``release_module`` them on
+shutdown or after switching to other weights. A copy that is no longer
+current and that no replica holds is dropped, so redeploying with new weights
+does not leave the old ones in the object store until the cluster restarts.
+"""
+import copy
+import hashlib
+import warnings
+
+import ray
+import torch
+
+
+WEIGHT_STORE_NAME = "ocr_weight_store"
+WEIGHT_STORE_NAMESPACE = "ocr"
+
+
+@ray.remote(num_cpus=0)
+class WeightStore:
+    """Detached owner of the shared weights, keyed by digest and refcounted."""
+
+    def __init__(self):
+        self.refs = {}
+        # replicas holding each copy
+        self.holders = {}
+        # shared model name -> digest of its latest build
+        self.current = {}
+
+    def reserve(self, name, key):
+        """Make ``key`` the current weights of ``name``; returns whether it is stored."""
+        previous = self.current.get(name)
+        self.current[name] = key
+        if previous != key:
+            self.drop_unused(previous)
+        return key in self.refs
+
+    def put(self, key, weights):
+        if key not in self.refs:
+            self.refs[key] = ray.put(weights)
+
+    def retain(self, key):
+        # wrapped in a list so the caller gets the ref, not the weights
+        if key not in self.refs:
+            return None
+        self.holders[key] = self.holders.get(key, 0) + 1
+        return [self.refs[key]]
+
+    def release(self, key):
+        holders = self.holders.get(key, 0) - 1
+        if holders > 0:
+            self.holders[key] = holders
+        else:
+            self.holders.pop(key, None)
+            self.drop_unused(key)
+
+    def drop_unused(self, key):
+        # replicas that mapped the weights keep their pages until they exit
+        if key not in self.holders and key not in self.current.values():
+            self.refs.pop(key, None)
+
+
+def weight_store():
+    return WeightStore.options(
+        name=WEIGHT_STORE_NAME,
+        namespace=WEIGHT_STORE_NAMESPACE,
+        lifetime="detached",
+        get_if_exists=True,
+    ).remote()
+
+
+def weights_digest(weights):
+    digest = hashlib.blake2b(digest_size=16)
+    for name, array in weights.items():
+        digest.update(name.encode())
+        digest.update(str(array.dtype).encode() + str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+class SharedModule:
+    """A module without its weights plus the store key of them."""
+
+    def __init__(self, skeleton, key):
+        self.skeleton = skeleton
+        self.key = key
+
+
+def share_module(module, name):
+    """Put the weights of ``module`` in the object store and return a ``SharedModule``.
+
+    ``name`` identifies the model across builds: sharing new weights under
+    the same name lets the previous ones go once no replica holds them.
+    """
+    weights = {
+        name: tensor.detach().cpu().numpy() for name, tensor in module.state_dict().items()
+    }
+    store = weight_store()
+    key = weights_digest(weights)
+    if not ray.get(store.reserve.remote(name, key)):
+        ray.get(store.put.remote(key, weights))
+
+    # deep-copy everything but the weights, which become storage-less meta
+    # tensors; non-weight tensor attributes (e.g. YOLO strides) are kept
+    memo = {}
+    for param in module.parameters():
+        memo[id(param)] = torch.nn.Parameter(
+            param.detach().to("meta"), requires_grad=param.requires_grad
+        )
+    for buffer in module.buffers():
+        memo[id(buffer)] = buffer.detach().to("meta")
+    return SharedModule(copy.deepcopy(module, memo), key)
+
+
+def materialize(shared, device="cpu"):
+    """Rebuild a module from a ``SharedModule``; plain modules pass through."""
+    if not isinstance(shared, SharedModule):
+        return shared.to(device)
+
+    stored = ray.get(weight_store().retain.remote(shared.key))
+    if stored is None:
+        raise RuntimeError(
+            f"Shared weights {shared.key} are gone from the weight store; redeploy the application"
+        )
+    weights = ray.get(stored[0])
+    with warnings.catch_warnings():
+        # the arrays are read-only views of the object store, which is fine
+        # for inference
+        warnings.filterwarnings("ignore", message="The given NumPy array is not writable")
+        state_dict = {name: torch.from_numpy(array) for name, array in weights.items()}
+
+    module = shared.skeleton
+    module.load_state_dict(state_dict, assign=True)
+    # only copies when moving off the CPU
+    return module.to(device)
+
+
+def release_module(shared):
+    """Give back the weights a replica retained in ``materialize``; a no-op for plain modules."""
+    if isinstance(shared, SharedModule):
+        weight_store().release.remote(shared.key)
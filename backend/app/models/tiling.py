@@ -0,0 +1,116 @@
+"""Tiled text detection for images much larger than the detector input.
+
+YOLO letterboxes its input to ``imgsz`` (640 by default), so on a 4000x6000
+scan small text shrinks below what the detector can see. Large images are
+instead cut into overlapping ``tile_size`` tiles that are detected at full
+resolution; the tile boxes are shifted back to image coordinates and the
+duplicates found on both sides of a seam are merged.
+"""
+import torch
+from torchvision.ops import batched_nms
+
+TILE_SIZE = 1024
+TILE_OVERLAP = 128
+# images whose longer side exceeds this are tiled
+TILING_THRESHOLD = 2048
+TILE_NMS_IOU = 0.5
+# a box touching an inner tile edge and mostly inside a larger box of the
+# same class (a word cut by a seam) is dropped even when their IoU is low
+TILE_MERGE_IOS = 0.8
+# a box within this many pixels of an inner tile edge touches it
+TILE_EDGE_MARGIN = 2
+
+
+def check_tiling(tile_size, overlap, threshold=TILING_THRESHOLD):
+    """Raise ``ValueError`` unless the tiles advance by a positive stride."""
+    if tile_size <= 0 or threshold <= 0:
+        raise ValueError(
+            f"tile_size and tiling_threshold must be positive, got {tile_size} and {threshold}"
+        )
+    if not 0 <= overlap < tile_size:
+        raise ValueError(
+            f"tile_overlap must be at least 0 and less than tile_size {tile_size}, got {overlap}"
+        )
+
+
+def tile_origins(length, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Start offsets of the tiles along one axis; the last tile ends flush."""
+    check_tiling(tile_size, overlap)
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    origins = list(range(0, length - tile_size, stride))
+    origins.append(length - tile_size)
+    return origins
+
+
+def tile_image(image, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """Split an ``(H, W, C)`` array into ``(x0, y0, tile)`` views, no copies."""
+    height, width = image.shape[:2]
+    return [
+        (x0, y0, image[y0:y0 + tile_size, x0:x0 + tile_size])
+        for y0 in tile_origins(height, tile_size, overlap)
+        for x0 in tile_origins(width, tile_size, overlap)
+    ]
+
+
+def touches_tile_edge(boxes, x0, y0, tile_shape, image_shape, margin=TILE_EDGE_MARGIN):
+    """Which ``(N, 4)`` xyxy tile boxes touch an edge of the tile inside the image.
+
+    Only those edges cut through content; the image border does not.
+    """
+    tile_height, tile_width = tile_shape[:2]
+    height, width = image_shape[:2]
+    touches = torch.zeros(len(boxes), dtype=torch.bool, device=boxes.device)
+    if x0 > 0:
+        touches |= boxes[:, 0] <= margin
+    if y0 > 0:
+        touches |= boxes[:, 1] <= margin
+    if x0 + tile_width < width:
+        touches |= boxes[:, 2] >= tile_width - margin
+    if y0 + tile_height < height:
+        touches |= boxes[:, 3] >= tile_height - margin
+    return touches
+
+
+def merge_tile_detections(
+    boxes,
+    scores,
+    classes,
+    at_edge,
+    iou_threshold=TILE_NMS_IOU,
+    ios_threshold=TILE_MERGE_IOS,
+):
+    """Indices of the boxes to keep after merging detections across tiles.
+
+    ``boxes`` are ``(N, 4)`` xyxy in image coordinates and ``at_edge`` flags
+    the boxes that touch an inner edge of their tile (``touches_tile_edge``).
+    Class-aware NMS removes the overlapping duplicates, then flagged boxes
+    whose area lies mostly inside a larger box of the same class are removed
+    too, whatever their score: the piece of a word cut by a tile edge often
+    scores higher than the word. Nested boxes away from the seams are kept,
+    as they would be on an untiled image.
+    """
+    if boxes.numel() == 0:
+        return torch.zeros(0, dtype=torch.long)
+
+    keep = batched_nms(boxes.float(), scores.float(), classes, iou_threshold)
+    # batched_nms returns the kept indices by decreasing score
+    kept_boxes = boxes[keep].float()
+    kept_classes = classes[keep]
+
+    top_left = torch.max(kept_boxes[:, None, :2], kept_boxes[None, :, :2])
+    bottom_right = torch.min(kept_boxes[:, None, 2:], kept_boxes[None, :, 2:])
+    intersection = (bottom_right - top_left).clamp(min=0).prod(dim=2)
+    areas = (kept_boxes[:, 2:] - kept_boxes[:, :2]).clamp(min=0).prod(dim=1)
+    # row i: share of box i covered by box j
+    ios = intersection / areas.clamp(min=1e-6)[:, None]
+
+    same_class = kept_classes[:, None] == kept_classes[None, :]
+    # ties on area go to the higher score
+    higher_score = torch.ones_like(same_class).triu(diagonal=1).T
+    larger = (areas[None, :] > areas[:, None]) | (
+        (areas[None, :] == areas[:, None]) & higher_score
+    )
+    covered = ((ios > ios_threshold) & same_class & larger).any(dim=1) & at_edge[keep]
+    return keep[~covered]
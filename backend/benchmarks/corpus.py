@@ -0,0 +1,60 @@
+"""Synthetic text-image corpus shared by the benchmarks.
+
+Pages are rendered locally with PIL from a fixed seed, so every run sees the
+same images without downloading anything.
+"""
+import io
+import random
+
+from PIL import Image, ImageDraw, ImageFont
+
+from app.models.crnn import CHARS
+from app.models.ctc import BLANK_CHAR
+
+ALPHABET = CHARS.replace(BLANK_CHAR, "")
+
+
+def load_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only has the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def random_word(rng, min_length=3, max_length=12):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(min_length, max_length)))
+
+
+def render_page(rng, size=(640, 640), lines=8, words_per_line=4, font_size=28):
+    """Render one page of random words; returns the PIL image and its words."""
+    width, height = size
+    image = Image.new("RGB", size, color=(255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    font = load_font(font_size)
+
+    words = []
+    line_height = height // (lines + 1)
+    for line in range(lines):
+        x = rng.randint(5, 40)
+        y = line_height // 2 + line * line_height
+        for _ in range(words_per_line):
+            word = random_word(rng)
+            draw.text((x, y), word, fill=(0, 0, 0), font=font)
+            words.append(word)
+            x += int(draw.textlength(word, font=font)) + rng.randint(15, 40)
+            if x >= width:
+                break
+    return image, words
+
+
+def text_image_corpus(count, size=(640, 640), image_format="PNG", seed=0):
+    """``count`` encoded pages as ``(bytes, words)`` pairs, identical for a given seed."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        image, words = render_page(rng, size)
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format)
+        corpus.append((buffer.getvalue(), words))
+    return corpus
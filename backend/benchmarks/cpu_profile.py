@@ -0,0 +1,92 @@
+"""Pipeline throughput for different replicas x threads layouts of a CPU node.
+
+    cd backend && python -m benchmarks.cpu_profile --grid 8x4 16x2 32x1 --requests 256
+
+Each ``<replicas>x<cpus>`` combination deploys that many detector and
+recognizer replicas with ``cpus`` Ray CPUs each, which ``app.core.cpu`` turns
+into torch intra-op threads per replica, then pushes distinct synthetic
+images through the ingress handle like ``benchmarks.pipeline_scaling``,
+whose stub detector boxes (``--text-boxes``) keep the recognizer busy.
+Combinations that do not fit on the node are skipped. ``--pin`` also pins
+the replicas to cores, for comparison. Reports images/s and latency
+percentiles per combination as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+
+import ray
+from ray import serve
+
+from app.api.v1.endpoints.ocr import build_pipeline
+from app.core.cpu import available_cores
+from app.models.crnn import build_crnn
+from benchmarks.pipeline_scaling import drive, synthetic_images
+from benchmarks.stub_detector import text_detector
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--det-weights", default="yolov8n.yaml")
+    parser.add_argument("--reg-weights", help="CRNN state dict; random weights if omitted")
+    parser.add_argument(
+        "--text-boxes", default="8x4", help="<rows>x<cols> stub boxes per image, or none"
+    )
+    parser.add_argument("--grid", nargs="+", default=["1x4", "2x2", "4x1"])
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--image-size", type=int, nargs=2, default=[640, 640])
+    parser.add_argument("--pin", action="store_true", help="pin replicas to cores")
+    args = parser.parse_args()
+
+    det_model = text_detector(args.det_weights, args.text_boxes)
+    reg_model = build_crnn(args.reg_weights)
+    reg_model.eval()
+
+    cores = len(available_cores())
+    # replicas read the profile settings from their environment
+    ray.init(runtime_env={"env_vars": {"OCR_PIN_CORES": "1" if args.pin else "0"}})
+    report = {
+        "cores": cores,
+        "pinned": args.pin,
+        "text_boxes": args.text_boxes,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "results": [],
+    }
+    for seed, combination in enumerate(args.grid):
+        replicas, cpus = map(int, combination.split("x"))
+        # both stages, plus one core for the ingress
+        if 2 * replicas * cpus + 1 > cores:
+            report["results"].append(
+                {"replicas": replicas, "threads": cpus, "skipped": f"needs {2 * replicas * cpus + 1} cores"}
+            )
+            continue
+
+        # deployment_options reads these when the pipeline is built
+        for stage in ("OCR_DETECTOR", "OCR_RECOGNIZER"):
+            os.environ[f"{stage}_NUM_CPUS"] = str(cpus)
+        handle = serve.run(
+            build_pipeline(
+                det_model,
+                reg_model,
+                detector_replicas=replicas,
+                recognizer_replicas=replicas,
+            ),
+            route_prefix=None,
+        )
+        warmup = synthetic_images(2 * replicas, args.image_size, seed=10_000 + seed)
+        asyncio.run(drive(handle, warmup, args.concurrency))
+
+        images = synthetic_images(args.requests, args.image_size, seed=seed)
+        result = {"replicas": replicas, "threads": cpus}
+        result.update(asyncio.run(drive(handle, images, args.concurrency)))
+        report["results"].append(result)
+        serve.shutdown()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Micro-benchmark of CTC decoding on random CRNN-shaped outputs.
+
+    cd backend && python -m benchmarks.ctc_decode
+
+Compares the original per-timestep Python loop against the vectorized
+greedy decoder and the prefix beam search, and prints the timings as JSON.
+"""
+import argparse
+import json
+import time
+
+import torch
+
+from app.models.crnn import CHAR_TO_IDX, CHARS, IDX_TO_CHAR
+from app.models.ctc import BLANK_CHAR, beam_search_decode, greedy_decode
+
+
+def legacy_decode(encoded_sequences, idx_to_char, blank_char=BLANK_CHAR):
+    # the loop OCRHandler.decode_prediction used before the vectorized decoder
+    decoded_sequences = []
+    for seq in encoded_sequences:
+        decoded_seq = []
+        prev_char = None
+        for idx in seq:
+            char = idx_to_char.get(int(idx), blank_char)
+            if char != blank_char:
+                if char != prev_char or prev_char == blank_char:
+                    decoded_seq.append(char)
+            prev_char = char
+        decoded_sequences.append("".join(decoded_seq))
+    return decoded_sequences
+
+
+def best_of(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started_at)
+    return round(min(timings) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--timesteps", type=int, default=14)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 128, 512])
+    parser.add_argument("--beam-width", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    blank_idx = CHAR_TO_IDX[BLANK_CHAR]
+    results = []
+    for batch_size in args.batch_sizes:
+        log_probs = torch.randn(args.timesteps, batch_size, len(CHARS)).log_softmax(2)
+        results.append(
+            {
+                "batch_size": batch_size,
+                "legacy_ms": best_of(
+                    lambda: legacy_decode(log_probs.permute(1, 0, 2).argmax(2), IDX_TO_CHAR),
+                    args.repeats,
+                ),
+                "greedy_ms": best_of(
+                    lambda: greedy_decode(log_probs, IDX_TO_CHAR, blank_idx), args.repeats
+                ),
+                "beam_ms": best_of(
+                    lambda: beam_search_decode(
+                        log_probs, IDX_TO_CHAR, blank_idx, beam_width=args.beam_width
+                    ),
+                    args.repeats,
+                ),
+            }
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
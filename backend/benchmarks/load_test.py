@@ -0,0 +1,205 @@
+"""End-to-end load generator for ``POST /ocr/upload``.
+
+    cd backend && python -m benchmarks.load_test --requests 200 --concurrency 16 --rate 20
+    cd backend && python -m benchmarks.load_test --url http://localhost:8000 --output run.json
+
+Uploads pages from the synthetic corpus (``benchmarks.corpus``) at up to
+``--concurrency`` requests in flight and, with ``--rate``, an open-loop
+arrival rate in requests per second. Every upload is a distinct page so the
+result cache never answers. Without ``--url`` the pipeline is started
+locally on Ray with an untrained ``yolov8n`` and a randomly initialized CRNN,
+so it runs offline on CPU. The untrained detector finds no text by itself, so
+its output is replaced with a ``--text-boxes`` grid per page, laid out like
+the corpus lines (``benchmarks.stub_detector``), and the recognizer runs on
+every page.
+
+Reports throughput, p50/p95/p99 latency, errors and the peak RSS summed over
+the Ray worker processes on this host, as JSON with stable keys.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import threading
+import time
+
+import httpx
+
+from benchmarks.corpus import text_image_corpus
+
+RSS_SAMPLE_INTERVAL_S = 0.2
+
+
+def ray_workers_rss():
+    """Summed RSS, in bytes, of the ``ray::`` processes on this host."""
+    total = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if not f.read().startswith(b"ray::"):
+                    continue
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            # the process exited while we were looking
+            continue
+    return total
+
+
+class PeakRSS:
+    """Samples ``ray_workers_rss`` in a thread and keeps the maximum."""
+
+    def __init__(self, interval_s=RSS_SAMPLE_INTERVAL_S):
+        self.interval_s = interval_s
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, ray_workers_rss())
+            self._stop.wait(self.interval_s)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 1)
+
+
+async def run_load(url, corpus, concurrency, rate, timeout_s):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = {}
+
+    async def upload(client, index, image_data):
+        async with semaphore:
+            started_at = time.perf_counter()
+            try:
+                response = await client.post(
+                    f"{url}/ocr/upload",
+                    files={"file": (f"page-{index}.png", image_data, "image/png")},
+                )
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if status == 200:
+                latencies.append(time.perf_counter() - started_at)
+            else:
+                errors[str(status)] = errors.get(str(status), 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout_s, limits=limits) as client:
+        tasks = []
+        started_at = time.perf_counter()
+        for index, (image_data, _) in enumerate(corpus):
+            if rate:
+                # open loop: arrivals follow the schedule whatever the latency
+                delay = started_at + index / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(upload(client, index, image_data)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    return {
+        "duration_s": round(elapsed, 2),
+        "completed": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p95": percentile(latencies, 95),
+        "latency_ms_p99": percentile(latencies, 99),
+    }
+
+
+def start_local_pipeline(det_weights, reg_weights, port, text_boxes="8x4"):
+    import ray
+    from ray import serve
+
+    from app.api.v1.endpoints.ocr import build_pipeline
+    from app.models.crnn import build_crnn
+    from benchmarks.stub_detector import text_detector
+
+    ray.init()
+    serve.start(http_options={"host": "127.0.0.1", "port": port})
+    det_model = text_detector(det_weights, text_boxes)
+    serve.run(build_pipeline(det_model, build_crnn(reg_weights)), route_prefix="/")
+    return f"http://127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="running OCR application; started locally if omitted")
+    parser.add_argument("--det-weights", default="yolov8n.yaml")
+    parser.add_argument("--reg-weights", help="CRNN state dict; random weights if omitted")
+    parser.add_argument(
+        "--text-boxes", default="8x4", help="<rows>x<cols> stub boxes per page, or none"
+    )
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=0, help="requests/s; 0 sends as fast as allowed")
+    parser.add_argument("--warmup", type=int, default=4)
+    parser.add_argument("--image-size", type=int, nargs=2, default=[640, 640])
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    url = args.url or start_local_pipeline(
+        args.det_weights, args.reg_weights, args.port, args.text_boxes
+    )
+    corpus = text_image_corpus(
+        args.warmup + args.requests, tuple(args.image_size), seed=args.seed
+    )
+    asyncio.run(run_load(url, corpus[:args.warmup], args.concurrency, 0, args.timeout))
+
+    with PeakRSS() as rss:
+        result = asyncio.run(
+            run_load(url, corpus[args.warmup:], args.concurrency, args.rate, args.timeout)
+        )
+    result["peak_rss_mb"] = round(rss.peak / 2**20, 1)
+
+    report = {
+        "config": {
+            "url": url,
+            "local": args.url is None,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "image_size": args.image_size,
+            "seed": args.seed,
+            "random_weights": args.url is None and args.reg_weights is None,
+            "text_boxes": None if args.url else args.text_boxes,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "result": result,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Micro-benchmarks of the OCR hot paths on CPU.
+
+    cd backend && python -m benchmarks.microbench --output microbench.json
+
+Times ``CRNN.forward`` for every batch size and width bucket, greedy and beam
+CTC decoding of its real output, and ``draw_predictions`` on a synthetic page
+with a given number of boxes, at full size and as a downscaled preview.
+Without ``--weights`` the CRNN is randomly initialized so it runs offline.
+The JSON report (stdout, or ``--output``) has stable keys so two runs can be
+diffed.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import time
+
+import numpy as np
+import torch
+
+from app.core.annotation import draw_predictions
+from app.models.crnn import CHAR_TO_IDX, IDX_TO_CHAR, INPUT_SIZE, build_crnn
+from app.models.ctc import BLANK_CHAR, beam_search_decode, greedy_decode
+from app.models.preprocessing import WIDTH_BUCKETS
+from benchmarks.corpus import render_page
+
+
+def measure(fn, repeats, warmup=1):
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started_at)
+    return {
+        "ms_p50": round(statistics.median(latencies) * 1000, 3),
+        "ms_min": round(min(latencies) * 1000, 3),
+    }
+
+
+def bench_forward(model, batch_sizes, widths, repeats):
+    results = []
+    height = INPUT_SIZE[0]
+    for width in widths:
+        for batch_size in batch_sizes:
+            batch = torch.randn(batch_size, 1, height, width)
+            with torch.no_grad():
+                result = measure(lambda: model(batch), repeats)
+            result.update(
+                {
+                    "width": width,
+                    "batch_size": batch_size,
+                    "crops_per_s": round(batch_size / result["ms_p50"] * 1000, 1),
+                }
+            )
+            results.append(result)
+    return results
+
+
+def bench_decode(model, batch_sizes, repeats, beam_width):
+    results = []
+    blank_idx = CHAR_TO_IDX[BLANK_CHAR]
+    height, width = INPUT_SIZE
+    for batch_size in batch_sizes:
+        with torch.no_grad():
+            log_probs = model(torch.randn(batch_size, 1, height, width))
+        for decoder, decode in (
+            ("greedy", lambda: greedy_decode(log_probs, IDX_TO_CHAR, blank_idx)),
+            (
+                "beam",
+                lambda: beam_search_decode(
+                    log_probs, IDX_TO_CHAR, blank_idx, beam_width=beam_width
+                ),
+            ),
+        ):
+            result = measure(decode, repeats)
+            result.update({"decoder": decoder, "batch_size": batch_size})
+            results.append(result)
+    return results
+
+
+def bench_draw(box_counts, scales, repeats):
+    rng = random.Random(0)
+    page, _ = render_page(rng)
+    image = np.asarray(page)
+    height, width = image.shape[:2]
+
+    results = []
+    for box_count in box_counts:
+        predictions = []
+        for _ in range(box_count):
+            x, y = rng.randint(0, width - 100), rng.randint(0, height - 30)
+            predictions.append(
+                {
+                    "bbox": [x, y, x + 100, y + 30],
+                    "class": "text",
+                    "confidence": 0.9,
+                    "text": "benchmark",
+                    "text_confidence": 0.9,
+                }
+            )
+        for scale in scales:
+            result = measure(lambda: draw_predictions(image, predictions, scale), repeats)
+            result["boxes"] = box_count
+            result["scale"] = scale
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weights", help="CRNN state dict; random weights if omitted")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--widths", type=int, nargs="+", default=list(WIDTH_BUCKETS))
+    parser.add_argument("--box-counts", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--beam-width", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--preview-scales", type=float, nargs="+", default=[1.0, 0.5])
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    model = build_crnn(args.weights)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "threads": torch.get_num_threads(),
+            "random_weights": args.weights is None,
+        },
+        "crnn_forward": bench_forward(model, args.batch_sizes, args.widths, args.repeats),
+        "decode_prediction": bench_decode(model, args.batch_sizes, args.repeats, args.beam_width),
+        "draw_predictions": bench_draw(args.box_counts, args.preview_scales, args.repeats),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Throughput of the OCR pipeline for different detector/recognizer replica counts.
+
+    cd backend && python -m benchmarks.pipeline_scaling --grid 1x1 1x2 2x2 --requests 64
+
+Starts a local Ray cluster, deploys the pipeline CPU-only once per
+``<detector replicas>x<recognizer replicas>`` combination and pushes distinct
+synthetic images through the ingress handle, bypassing the result cache.
+Without weights the detector is an untrained ``yolov8n``, which finds no text
+by itself, so its output is replaced with a ``--text-boxes`` grid of boxes per
+image (``benchmarks.stub_detector``; ``none`` keeps the detector's own boxes,
+for trained weights). The CRNN is randomly initialized. Texts are
+meaningless, but both stages do a realistic amount of work per image, enough
+to see which one saturates first. Reports images/s and latency percentiles
+per combination as JSON.
+"""
+import argparse
+import asyncio
+import io
+import json
+import statistics
+import time
+
+import numpy as np
+import ray
+from PIL import Image
+from ray import serve
+
+from app.api.v1.endpoints.ocr import build_pipeline
+from app.models.crnn import build_crnn
+from benchmarks.stub_detector import text_detector
+
+
+def synthetic_images(count, size, seed=0):
+    """Distinct PNG payloads, so neither cache tier short-circuits a request."""
+    rng = np.random.default_rng(seed)
+    height, width = size
+    images = []
+    for _ in range(count):
+        array = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(array).save(buffer, format="PNG")
+        images.append(buffer.getvalue())
+    return images
+
+
+async def drive(handle, images, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(image_data):
+        async with semaphore:
+            started_at = time.perf_counter()
+            await handle.run_ocr.remote(image_data)
+            latencies.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(one(image_data) for image_data in images))
+    elapsed = time.perf_counter() - started_at
+    latencies.sort()
+    return {
+        "images_per_s": round(len(images) / elapsed, 2),
+        "latency_ms_p50": round(statistics.median(latencies) * 1000, 1),
+        "latency_ms_p95": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--det-weights", default="yolov8n.yaml")
+    parser.add_argument("--reg-weights", help="CRNN state dict; random weights if omitted")
+    parser.add_argument(
+        "--text-boxes", default="8x4", help="<rows>x<cols> stub boxes per image, or none"
+    )
+    parser.add_argument("--grid", nargs="+", default=["1x1", "1x2", "2x2"])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--image-size", type=int, nargs=2, default=[640, 640])
+    args = parser.parse_args()
+
+    det_model = text_detector(args.det_weights, args.text_boxes)
+    reg_model = build_crnn(args.reg_weights)
+    reg_model.eval()
+
+    ray.init()
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "text_boxes": args.text_boxes,
+        "results": [],
+    }
+    for seed, combination in enumerate(args.grid):
+        detector_replicas, recognizer_replicas = map(int, combination.split("x"))
+        handle = serve.run(
+            build_pipeline(
+                det_model,
+                reg_model,
+                detector_replicas=detector_replicas,
+                recognizer_replicas=recognizer_replicas,
+            ),
+            route_prefix=None,
+        )
+        # warm every replica before timing
+        warmup_count = 2 * max(detector_replicas, recognizer_replicas)
+        warmup = synthetic_images(warmup_count, args.image_size, seed=10_000 + seed)
+        asyncio.run(drive(handle, warmup, args.concurrency))
+
+        images = synthetic_images(args.requests, args.image_size, seed=seed)
+        result = {"detector_replicas": detector_replicas, "recognizer_replicas": recognizer_replicas}
+        result.update(asyncio.run(drive(handle, images, args.concurrency)))
+        report["results"].append(result)
+        serve.shutdown()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
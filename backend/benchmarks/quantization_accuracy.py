@@ -0,0 +1,161 @@
+"""Accuracy and speed regression check for the INT8 CRNN.
+
+    cd backend && python -m benchmarks.quantization_accuracy \
+        --weights app/models/weights/ocr_crnn.pt --dataset heldout/ [--calibration-dir crops/]
+
+``--dataset`` is a directory of word crops plus a ``labels.txt`` with one
+``<file name>\\t<text>`` line per crop. Crops go through ``prepare_crop``
+and are batched by width, as served; ``--keep-aspect-ratio`` measures the
+width buckets instead of stretched crops. Reports character and word error
+rate of each quantized variant against the FP32 model, and its speedup
+and weight size reduction, plus the FP32 error rates with stretched crops
+and with width buckets side by side, as JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from app.models.crnn import CHAR_TO_IDX, IDX_TO_CHAR, build_crnn
+from app.models.ctc import BLANK_CHAR, greedy_decode
+from app.models.preprocessing import bucket_by_width, prepare_crop
+from app.models.quantization import (
+    load_calibration_batches,
+    model_size_bytes,
+    quantize_crnn,
+)
+
+
+def load_dataset(directory):
+    """RGB ``uint8`` crops and their labels."""
+    crops, labels = [], []
+    with open(os.path.join(directory, "labels.txt")) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            name, text = line.rstrip("\n").split("\t", 1)
+            with Image.open(os.path.join(directory, name)) as image:
+                crops.append(np.asarray(image.convert("RGB")))
+            labels.append(text)
+    return crops, labels
+
+
+def preprocess(crops, keep_aspect_ratio):
+    """``{bucket width: (crop indices, batch)}`` of ``prepare_crop`` tensors."""
+    tensors = [prepare_crop(crop, keep_aspect_ratio=keep_aspect_ratio) for crop in crops]
+    return {
+        width: (indices, torch.stack([tensors[index] for index in indices]))
+        for width, indices in bucket_by_width(tensors).items()
+    }
+
+
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+
+def error_rates(predictions, labels):
+    pairs = list(zip(predictions, labels))
+    char_errors = sum(edit_distance(prediction, label) for prediction, label in pairs)
+    chars = sum(len(label) for label in labels)
+    word_errors = sum(prediction != label for prediction, label in pairs)
+    return {
+        "cer": char_errors / max(chars, 1),
+        "wer": word_errors / max(len(labels), 1),
+    }
+
+
+def run(model, buckets, batch_size, repeats):
+    latencies = []
+    with torch.no_grad():
+        for _ in range(repeats):
+            outputs = {}
+            started_at = time.perf_counter()
+            for width, (_, batch) in buckets.items():
+                outputs[width] = torch.cat(
+                    [
+                        model(batch[start:start + batch_size])
+                        for start in range(0, batch.size(0), batch_size)
+                    ],
+                    dim=1,
+                )
+            latencies.append(time.perf_counter() - started_at)
+
+    texts = [None] * sum(len(indices) for indices, _ in buckets.values())
+    for width, (indices, _) in buckets.items():
+        decoded = greedy_decode(outputs[width], IDX_TO_CHAR, CHAR_TO_IDX[BLANK_CHAR])
+        for index, (text, _) in zip(indices, decoded):
+            texts[index] = text
+    return texts, statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weights", required=True)
+    parser.add_argument("--dataset", required=True)
+    parser.add_argument("--calibration-dir")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--keep-aspect-ratio",
+        action="store_true",
+        help="measure the variants on width buckets instead of stretched crops",
+    )
+    args = parser.parse_args()
+
+    crops, labels = load_dataset(args.dataset)
+    buckets = preprocess(crops, args.keep_aspect_ratio)
+    fp32 = build_crnn(args.weights)
+    fp32.eval()
+    variants = {"fp32": fp32, "int8_dynamic": quantize_crnn(fp32)}
+    if args.calibration_dir:
+        calibration = load_calibration_batches(args.calibration_dir)
+        variants["int8_static"] = quantize_crnn(fp32, calibration)
+
+    report = {
+        "samples": len(labels),
+        "keep_aspect_ratio": args.keep_aspect_ratio,
+        "variants": {},
+        "preprocessing": {},
+    }
+    fp32_seconds = fp32_size = None
+    for name, model in variants.items():
+        predictions, seconds = run(model, buckets, args.batch_size, args.repeats)
+        size = model_size_bytes(model)
+        if name == "fp32":
+            fp32_seconds, fp32_size = seconds, size
+        result = error_rates(predictions, labels)
+        result.update(
+            {
+                "seconds": round(seconds, 4),
+                "speedup": round(fp32_seconds / seconds, 2),
+                "weights_bytes": size,
+                "memory_reduction": round(fp32_size / size, 2),
+            }
+        )
+        report["variants"][name] = result
+
+    # what the width buckets cost or gain against the stretched training input
+    for mode, keep_aspect_ratio in (("stretch", False), ("buckets", True)):
+        predictions, seconds = run(
+            fp32, preprocess(crops, keep_aspect_ratio), args.batch_size, args.repeats
+        )
+        result = error_rates(predictions, labels)
+        result["seconds"] = round(seconds, 4)
+        report["preprocessing"][mode] = result
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Compare the CRNN inference backends on CPU.
+
+    cd backend && python -m benchmarks.recognition_backends --weights app/models/weights/ocr_crnn.pt
+
+Exports the model to TorchScript and ONNX in a temporary directory, checks
+that every backend produces the same logits as eager PyTorch, then reports
+latency and throughput per backend and batch size as JSON. Without
+``--weights`` the CRNN is randomly initialized so it runs offline. Exits
+non-zero if a backend drifts past ``--atol``.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import torch
+
+from app.models.backends import load_recognition_backend
+from app.models.crnn import INPUT_SIZE, build_crnn
+from app.models.export import export_onnx, export_torchscript
+
+
+def time_backend(backend, batch, repeats):
+    backend(batch)  # warm-up
+    latencies = []
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        backend(batch)
+        latencies.append(time.perf_counter() - started_at)
+    median = statistics.median(latencies)
+    return {
+        "latency_ms_p50": round(median * 1000, 3),
+        "latency_ms_min": round(min(latencies) * 1000, 3),
+        "crops_per_s": round(batch.size(0) / median, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weights", help="CRNN state dict; random weights if omitted")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--atol", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    model = build_crnn(args.weights)
+
+    report = {"threads": torch.get_num_threads(), "parity": {}, "results": []}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        backends = {"eager": load_recognition_backend("eager", model=model)}
+        backends["torchscript"] = load_recognition_backend(
+            "torchscript",
+            path=export_torchscript(model, os.path.join(tmp_dir, "crnn.ts")),
+        )
+        try:
+            backends["onnx"] = load_recognition_backend(
+                "onnx", path=export_onnx(model, os.path.join(tmp_dir, "crnn.onnx"))
+            )
+        except ImportError:
+            print("onnxruntime is not installed, skipping the onnx backend", file=sys.stderr)
+
+        height, width = INPUT_SIZE
+        parity_batch = torch.randn(3, 1, height, width)
+        reference = backends["eager"](parity_batch)
+        drifted = False
+        for name, backend in backends.items():
+            max_diff = (backend(parity_batch) - reference).abs().max().item()
+            report["parity"][name] = max_diff
+            drifted = drifted or max_diff > args.atol
+
+        for batch_size in args.batch_sizes:
+            batch = torch.randn(batch_size, 1, height, width)
+            for name, backend in backends.items():
+                result = {"backend": name, "batch_size": batch_size}
+                result.update(time_backend(backend, batch, args.repeats))
+                report["results"].append(result)
+
+    print(json.dumps(report, indent=2))
+    if drifted:
+        sys.exit(f"Backend logits differ from eager by more than {args.atol}")
+
+
+if __name__ == "__main__":
+    main()
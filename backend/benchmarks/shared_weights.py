@@ -0,0 +1,72 @@
+"""Replica cold-start time and memory with pickled vs shared CRNN weights.
+
+    cd backend && python -m benchmarks.shared_weights --replicas 1 2 4
+
+Starts ``N`` Ray actors that each hold a CRNN, once with the module pickled
+into every actor (how models used to be bound) and once through
+``app.models.shared_weights``, and reports the time until all actors are ready
+and the mean RSS/PSS per actor as JSON. With shared weights PSS should stay
+roughly flat as replicas are added. Without ``--weights`` the CRNN is randomly
+initialized so it runs offline.
+"""
+import argparse
+import json
+import statistics
+import time
+
+import ray
+import torch
+
+from app.core.serving import process_memory
+from app.models.crnn import INPUT_SIZE, build_crnn
+from app.models.shared_weights import materialize, share_module
+
+
+@ray.remote(num_cpus=0)
+class Replica:
+    def __init__(self, model):
+        self.model = materialize(model).eval()
+        height, width = INPUT_SIZE
+        with torch.no_grad():
+            self.model(torch.zeros(1, 1, height, width))
+
+    def memory(self):
+        return process_memory()
+
+
+def start_replicas(model, count):
+    started_at = time.perf_counter()
+    replicas = [Replica.remote(model) for _ in range(count)]
+    memory = ray.get([replica.memory.remote() for replica in replicas])
+    startup_s = time.perf_counter() - started_at
+    for replica in replicas:
+        ray.kill(replica)
+    return {
+        "startup_s": round(startup_s, 3),
+        "rss_mb": round(statistics.mean(m["rss"] for m in memory) / 2**20, 1),
+        "pss_mb": round(statistics.mean(m.get("pss", m["rss"]) for m in memory) / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weights", help="CRNN state dict; random weights if omitted")
+    parser.add_argument("--replicas", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    model = build_crnn(args.weights).eval()
+    ray.init()
+    shared = share_module(model, "benchmark")
+
+    report = {"results": []}
+    for count in args.replicas:
+        for mode, bound in (("pickled", model), ("shared", shared)):
+            result = {"mode": mode, "replicas": count}
+            result.update(start_replicas(bound, count))
+            report["results"].append(result)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
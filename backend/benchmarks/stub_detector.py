@@ -0,0 +1,67 @@
+"""A text detector that always finds text, for the pipeline benchmarks.
+
+An untrained ``yolov8n`` finds essentially no boxes above the confidence
+threshold, so without trained weights the recognizer stage would never run.
+``GridDetector`` still runs the wrapped YOLO, so the detector stage does its
+real amount of work, then answers with a fixed ``rows x cols`` grid of
+word-shaped text boxes per image, laid out like the lines and words of
+``benchmarks.corpus`` pages.
+"""
+from types import SimpleNamespace
+
+import torch
+
+# class 0 regions are skipped by the pipeline, so the boxes use class 1
+TEXT_CLASS = 1
+
+
+class GridDetector(torch.nn.Module):
+    def __init__(self, yolo, rows=8, cols=4):
+        super().__init__()
+        self.yolo = yolo
+        self.rows = rows
+        self.cols = cols
+
+    def fuse(self):
+        self.yolo.fuse()
+        return self
+
+    def forward(self, images, **kwargs):
+        results = self.yolo(images, **kwargs)
+        return [
+            SimpleNamespace(boxes=self.grid_boxes(image.shape[:2]), names=result.names)
+            for image, result in zip(images, results)
+        ]
+
+    def grid_boxes(self, shape):
+        height, width = shape
+        cell_height, cell_width = height / (self.rows + 1), width / self.cols
+        xyxy = torch.tensor(
+            [
+                [
+                    col * cell_width + 0.1 * cell_width,
+                    (row + 0.5) * cell_height,
+                    (col + 1) * cell_width - 0.1 * cell_width,
+                    (row + 1) * cell_height,
+                ]
+                for row in range(self.rows)
+                for col in range(self.cols)
+            ]
+        )
+        count = len(xyxy)
+        return SimpleNamespace(
+            xyxy=xyxy,
+            cls=torch.full((count,), float(TEXT_CLASS)),
+            conf=torch.ones(count),
+        )
+
+
+def text_detector(det_weights, text_boxes="8x4"):
+    """YOLO from ``det_weights``, wrapped in a ``GridDetector`` unless ``text_boxes`` is "none"."""
+    from ultralytics import YOLO
+
+    yolo = YOLO(det_weights)
+    if text_boxes == "none":
+        return yolo
+    rows, cols = map(int, text_boxes.split("x"))
+    return GridDetector(yolo, rows, cols)
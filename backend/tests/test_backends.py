@@ -0,0 +1,67 @@
+"""Recognition backends against eager PyTorch, at several bucket widths."""
+import os
+
+import pytest
+import torch
+
+from app.models.backends import load_recognition_backend
+from app.models.crnn import INPUT_SIZE, build_crnn
+from app.models.export import export_onnx, export_torchscript
+
+WIDTHS = (128, 256, 420)
+# exported graphs compute the same ops as eager
+EXPORT_ATOL = 1e-3
+# INT8 weights move the log-probabilities a little, never the best path
+QUANTIZED_ATOL = 0.1
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    # the serving backbone with a small head keeps the test fast
+    return build_crnn(hidden_size=32, n_layers=1)
+
+
+@pytest.fixture(scope="module")
+def export_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp("exports")
+
+
+def crops(width, batch_size=2):
+    torch.manual_seed(width)
+    return torch.rand(batch_size, 1, INPUT_SIZE[0], width) * 255
+
+
+def backend(name, model, export_dir):
+    if name == "torchscript":
+        path = export_torchscript(model, os.path.join(export_dir, "crnn.ts"))
+        return load_recognition_backend(name, path=path)
+    if name == "onnx":
+        pytest.importorskip("onnxruntime")
+        path = export_onnx(model, os.path.join(export_dir, "crnn.onnx"))
+        return load_recognition_backend(name, path=path)
+    return load_recognition_backend(name, model=model)
+
+
+@pytest.mark.parametrize("name", ["torchscript", "onnx"])
+def test_exported_backends_match_eager(name, model, export_dir):
+    eager = load_recognition_backend("eager", model=model)
+    exported = backend(name, model, export_dir)
+    for width in WIDTHS:
+        batch = crops(width)
+        reference = eager(batch)
+        output = exported(batch)
+        assert output.shape == reference.shape
+        assert torch.allclose(output, reference, atol=EXPORT_ATOL), width
+
+
+def test_quantized_backend_matches_eager(model, export_dir):
+    eager = load_recognition_backend("eager", model=model)
+    quantized = backend("quantized", model, export_dir)
+    for width in WIDTHS:
+        batch = crops(width)
+        reference = eager(batch)
+        output = quantized(batch)
+        assert output.shape == reference.shape
+        assert torch.allclose(output, reference, atol=QUANTIZED_ATOL), width
+        assert torch.equal(output.argmax(dim=2), reference.argmax(dim=2)), width
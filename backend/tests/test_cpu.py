@@ -0,0 +1,31 @@
+"""CPU profile of the model replicas."""
+import pytest
+import torch
+
+from app.core.cpu import apply_cpu_profile, pool_workers
+
+
+@pytest.fixture
+def restore_threads():
+    threads = torch.get_num_threads()
+    yield
+    torch.set_num_threads(threads)
+
+
+@pytest.mark.parametrize("cpus", [1, 2, 4, 8])
+def test_pool_leaves_torch_most_cpus(cpus, restore_threads):
+    workers = pool_workers(cpus)
+    profile = apply_cpu_profile(cpus, workers=workers, pin=False)
+    assert workers >= 1
+    assert profile.intra_op_threads == max(1, cpus - workers)
+    assert profile.intra_op_threads >= workers or cpus == 1
+
+
+def test_default_recognizer_keeps_torch_threads(restore_threads):
+    # the deployment module needs Ray Serve
+    pytest.importorskip("ray")
+    from app.api.v1.endpoints.ocr import RECOGNIZER_OPTIONS
+
+    cpus = RECOGNIZER_OPTIONS["num_cpus"]
+    apply_cpu_profile(cpus, workers=pool_workers(cpus), pin=False)
+    assert torch.get_num_threads() > 1
@@ -0,0 +1,131 @@
+"""ImageFetcher against a local stub HTTP server.
+
+    cd backend && python -m pytest tests
+"""
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.http import FetchError, ImageFetcher
+
+SLOW_DELAY_S = 2.0
+IMAGE = b"\x89PNG fake image bytes"
+ETAG = '"v1"'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    full_downloads = 0
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(SLOW_DELAY_S)
+            self.reply(IMAGE)
+        elif self.path == "/image":
+            if self.headers.get("If-None-Match") == ETAG:
+                self.send_response(304)
+                self.send_header("ETag", ETAG)
+                self.end_headers()
+                return
+            type(self).full_downloads += 1
+            self.reply(IMAGE, {"ETag": ETAG})
+        elif self.path == "/big":
+            self.reply(b"x" * 4096)
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def reply(self, body, headers=None):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_slow_url_does_not_block_other_fetches(server_url):
+    async def scenario():
+        fetcher = ImageFetcher()
+        slow = asyncio.ensure_future(fetcher.fetch(f"{server_url}/slow"))
+        # let the slow download start before the others arrive
+        await asyncio.sleep(0.1)
+
+        async def fast():
+            body = await fetcher.fetch(f"{server_url}/big")
+            # finished while the slow download is still in flight
+            return body, slow.done()
+
+        started_at = time.perf_counter()
+        results = await asyncio.gather(*(fast() for _ in range(4)))
+        elapsed = time.perf_counter() - started_at
+
+        assert await slow == IMAGE
+        await fetcher.aclose()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(scenario())
+    assert elapsed < SLOW_DELAY_S / 2
+    for body, slow_done in results:
+        assert body == b"x" * 4096
+        assert not slow_done
+
+
+def test_download_past_max_bytes_is_refused(server_url):
+    async def scenario():
+        fetcher = ImageFetcher(max_bytes=1024)
+        try:
+            with pytest.raises(FetchError) as error:
+                await fetcher.fetch(f"{server_url}/big")
+        finally:
+            await fetcher.aclose()
+        return error.value
+
+    assert asyncio.run(scenario()).status_code == 413
+
+
+def test_repeated_url_is_revalidated(server_url):
+    async def scenario():
+        fetcher = ImageFetcher()
+        first = await fetcher.fetch(f"{server_url}/image")
+        second = await fetcher.fetch(f"{server_url}/image")
+        host_limits = dict(fetcher._host_limits)
+        await fetcher.aclose()
+        return first, second, host_limits
+
+    downloads_before = StubHandler.full_downloads
+    first, second, host_limits = asyncio.run(scenario())
+    assert first == second == IMAGE
+    # the second fetch was answered with 304
+    assert StubHandler.full_downloads == downloads_before + 1
+    # idle hosts do not keep a semaphore
+    assert host_limits == {}
+
+
+def test_http_errors_are_reported(server_url):
+    async def scenario():
+        fetcher = ImageFetcher()
+        try:
+            with pytest.raises(FetchError) as error:
+                await fetcher.fetch(f"{server_url}/missing")
+        finally:
+            await fetcher.aclose()
+        return error.value
+
+    assert "404" in str(asyncio.run(scenario()))
@@ -0,0 +1,30 @@
+"""Model registry manifests."""
+import pytest
+
+from app.models.registry import WeightsMismatch, load_model, register, resolve
+
+
+@pytest.fixture
+def weights(tmp_path):
+    path = tmp_path / "best.pt"
+    path.write_bytes(b"not really yolo weights")
+    return str(path)
+
+
+def test_registered_version_resolves_with_its_digest(weights, tmp_path):
+    root = str(tmp_path / "models")
+    registered = register("text_detection", weights, "yolo", version="v1", root=root)
+
+    model_version = resolve("text_detection", "latest", root=root)
+    assert model_version == registered
+    assert len(model_version.sha256) == 64
+
+
+def test_changed_weights_are_refused(weights, tmp_path):
+    root = str(tmp_path / "models")
+    model_version = register("text_detection", weights, "yolo", version="v1", root=root)
+    with open(model_version.weights, "r+b") as f:
+        f.truncate(4)
+
+    with pytest.raises(WeightsMismatch):
+        load_model(resolve("text_detection", "v1", root=root))
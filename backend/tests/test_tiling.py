@@ -0,0 +1,28 @@
+"""Tile layout of large images."""
+import numpy as np
+import pytest
+
+from app.models.tiling import check_tiling, tile_image, tile_origins
+
+
+def test_tiles_cover_the_image():
+    assert tile_origins(500, tile_size=1024) == [0]
+    assert tile_origins(2500, tile_size=1024, overlap=128) == [0, 896, 1476]
+    tiles = tile_image(np.zeros((2500, 1000, 3), dtype=np.uint8), 1024, 128)
+    assert [(x0, y0) for x0, y0, _ in tiles] == [(0, 0), (0, 896), (0, 1476)]
+
+
+@pytest.mark.parametrize(
+    "tile_size, overlap, threshold",
+    [(0, 0, 2048), (-1024, 128, 2048), (1024, 1024, 2048), (1024, 2048, 2048),
+     (1024, -1, 2048), (1024, 128, 0)],
+)
+def test_bad_tiling_is_refused(tile_size, overlap, threshold):
+    with pytest.raises(ValueError):
+        check_tiling(tile_size, overlap, threshold)
+
+
+def test_overlap_of_a_whole_tile_never_reaches_the_layout():
+    # the stride would be zero, which range() rejects with an unclear error
+    with pytest.raises(ValueError, match="tile_overlap"):
+        tile_origins(4096, tile_size=1024, overlap=1024)
@@ -1,3 +1,5 @@
+import json
+
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -8,42 +10,29 @@ from PIL import Image
 
 st.set_page_config(layout="wide")
 
-def format_predictions(predictions_str):
-    """Format the predictions string into a list of dictionaries"""
-    predictions = []
-    ## cach 1
-    # for line in predictions_str.split("\n"):
-    #     if line.strip():
-    #         predictions.append(json.loads(line))
-    
-    
-    ## cach 2
-    try: 
-        predictions = eval(predictions_str)
-
-        if not predictions:
-            return "[]"
-        
-        formatted_json = "[\n"
-        for bbox, class_name, confidence, text in predictions:
-            formatted_json += f"    {{'bbox': {bbox}, 'class_name': '{class_name}', 'confidence': {confidence}, 'text': '{text}'}},\n"
-        formatted_json += "]"
-        formatted_json = formatted_json.rstrip(",\n") + "\n]"
-        return formatted_json
+# multi-page documents, answered by the API as one NDJSON line per page
+DOCUMENT_TYPES = ("pdf", "tif", "tiff")
+DOCUMENT_MEDIA_TYPES = {"pdf": "application/pdf", "tif": "image/tiff", "tiff": "image/tiff"}
 
-    except Exception as e:
-        return f"Error formatting predictions: {str(e)}" 
+def format_predictions(predictions):
+    """Format the predictions returned by the API for display"""
+    return json.dumps(predictions, indent=4)
 
 
 def process_image_url(url, api_url="http://localhost:8000"):
     """Process image from URL using the OCR API"""
     try:
-        response = requests.get(f"{api_url}/ocr", params={"image_url":url})
+        # predictions come as a JSON body; the annotated image is asked for
+        # separately, and the server answers it from its result cache
+        response = requests.get(f"{api_url}/ocr", params={"image_url": url, "format": "json"})
         # Raises an HTTPError if the HTTP request returned an unsuccessful status code
         response.raise_for_status()
+        predictions = response.json()["predictions"]
 
-        #get predictions from headers
-        predictions = response.headers.get("X-Predictions","[]")
+        response = requests.get(
+            f"{api_url}/ocr", params={"image_url": url, "format": "jpeg"}
+        )
+        response.raise_for_status()
 
         # Display the processed image
         image = Image.open(BytesIO(response.content))
@@ -64,23 +53,28 @@ def process_upload_file(file, api_url="http://localhost:8000"):
         except Exception as e:
             st.error("Please upload a valid image file")
 
-        # Prepare the file for upload
-        files = {"file": ("image.png", file, "image/png")}
-        
-        response = requests.post(f"{api_url}/ocr/upload", files = files)
+        image_data = file.read()
+        results = {}
+        # predictions as a JSON body, then the annotated image on its own
+        for response_format in ("json", "jpeg"):
+            # Prepare the file for upload
+            files = {"file": ("image.png", image_data, "image/png")}
 
-        if response.status_code != 200:
-            error_detail = response.json().get("detail", "Unknown error")
-            st.error(f"Server Error: {error_detail}")
-            return None, None
-        
-        response.raise_for_status()
+            response = requests.post(
+                f"{api_url}/ocr/upload", files = files, params={"format": response_format}
+            )
+
+            if response.status_code != 200:
+                error_detail = response.json().get("detail", "Unknown error")
+                st.error(f"Server Error: {error_detail}")
+                return None, None
 
-        #Get predictions from headers
-        predictions = response.headers.get("X-Predictions", "[]")
+            results[response_format] = response
+        
+        predictions = results["json"].json()["predictions"]
 
         # Display the processed images
-        image = Image.open(BytesIO(response.content))
+        image = Image.open(BytesIO(results["jpeg"].content))
         return image, predictions
 
     except requests.RequestException as e:
@@ -98,6 +92,35 @@ def process_upload_file(file, api_url="http://localhost:8000"):
         st.error(f"Unexpected error: {str(e)}")
         return None, None
 
+def process_document_file(file, api_url="http://localhost:8000", dpi=150):
+    """Process an uploaded PDF/TIFF; returns the per-page results in page order"""
+    extension = file.name.rsplit(".", 1)[-1].lower()
+    files = {"file": (file.name, file, DOCUMENT_MEDIA_TYPES[extension])}
+    pages = []
+    try:
+        with requests.post(
+            f"{api_url}/ocr/upload", files=files, params={"format": "json", "dpi": dpi},
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            # a single-page TIFF is answered like any image, as one JSON object
+            if not response.headers.get("content-type", "").startswith("application/x-ndjson"):
+                body = response.json()
+                return [{"page": 0, "name": file.name, "predictions": body["predictions"]}]
+
+            progress = st.empty()
+            # pages arrive as they finish, not necessarily in order
+            for line in response.iter_lines():
+                if line:
+                    pages.append(json.loads(line))
+                    progress.write(f"{len(pages)} page(s) processed")
+    except requests.RequestException as e:
+        st.error(f"Error processing document: {str(e)}")
+        return None
+
+    return sorted(pages, key=lambda page: page["page"])
+
+
 def main():
     st.title("OCR Image Processing")
 
@@ -139,7 +162,7 @@ def main():
                         st.image(image, use_container_width=True)
                     
                     st.subheader("Detected Text")
-                    st.code(format_predictions(predictions, language="text"))
+                    st.code(format_predictions(predictions), language="json")
     
     with tab2:
         st.header("Upload Image")
@@ -148,7 +171,8 @@ def main():
 
         with upload_col:
             uploaded_file = st.file_uploader(
-                "Choose an image file", type = ["jpeg", "jpg", "png"]
+                "Choose an image file or a PDF/TIFF document",
+                type = ["jpeg", "jpg", "png", *DOCUMENT_TYPES],
             )
         
         with button_col:
@@ -156,7 +180,26 @@ def main():
             st.write()
             process_button = st.button("Process Image", key = "process_upload")
         
-        if uploaded_file is not None:
+        is_document = (
+            uploaded_file is not None
+            and uploaded_file.name.rsplit(".", 1)[-1].lower() in DOCUMENT_TYPES
+        )
+        if is_document:
+            dpi = st.sidebar.slider("Document DPI", 72, 300, 150, step=6)
+            if process_button:
+                with st.spinner("Processing document..."):
+                    pages = process_document_file(uploaded_file, api_url, dpi)
+                for page in pages or []:
+                    with st.expander(page["name"]):
+                        if "error" in page:
+                            st.error(page["error"])
+                        else:
+                            st.code(
+                                json.dumps(page["predictions"], indent=4),
+                                language="json",
+                            )
+
+        elif uploaded_file is not None:
             col1, col2 = st.columns(2)
 
             with col1:
@@ -175,7 +218,7 @@ def main():
                             st.image(image, use_container_width=True)
                         
                         st.subheader("Detected Text")
-                        st.code(format_predictions(predictions), language="text")
+                        st.code(format_predictions(predictions), language="json")
                     
         
 